@@ -0,0 +1,70 @@
+"""Compare `figya -e` latency with and without a running `figya serve`.
+
+    python benchmarks/daemon_latency.py [-n RUNS] [EXPR ...]
+
+Each run is a fresh interpreter, as when figya is called from a shell script.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _time_runs(exprs: list[str], runs: int, env: dict) -> list[float]:
+    timings = []
+    for i in range(runs):
+        expr = exprs[i % len(exprs)]
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "figya", "-e", expr],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list[float]):
+    q = statistics.quantiles(timings, n=20)
+    print(f"  {label:<6} median {statistics.median(timings):7.1f} ms   p95 {q[18]:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=30)
+    parser.add_argument("exprs", nargs="*", default=["2 + 2", "5 feet in meters"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, FIGYA_DATA_DIR=data_dir)
+        socket_path = os.path.join(data_dir, "figya.sock")
+
+        # Warm the pint cache so "cold" measures a normal second run
+        _time_runs(args.exprs, 1, env)
+        cold = _time_runs(args.exprs, args.runs, env)
+
+        daemon = subprocess.Popen(
+            [sys.executable, "-m", "figya", "serve"],
+            env=env, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while not os.path.exists(socket_path):
+                if time.monotonic() > deadline or daemon.poll() is not None:
+                    sys.exit("figya serve did not start")
+                time.sleep(0.05)
+            warm = _time_runs(args.exprs, args.runs, env)
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+    print(f"figya -e, {args.runs} runs: {', '.join(args.exprs)}")
+    _report("cold", cold)
+    _report("warm", warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,4 +2,6 @@
 
 from figya.cli import main
 
-main()
+# Guarded so the evaluation worker (figya.budget) can import this module
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Array values: ranges, elementwise functions, reductions, display, encoding.
+
+NumPy is optional (`pip install '.[fast]'`) and only imported once an
+expression actually builds or uses an array, so scalar-only sessions never
+pay for it.
+"""
+
+import ast
+import functools
+import io
+import math
+import operator
+
+np = None
+
+# (numpy.ndarray,) once NumPy is loaded; isinstance against () is always False
+ARRAY_TYPES: tuple = ()
+
+# Longest range or linspace, so a typo can't try to allocate terabytes
+MAX_ARRAY_SIZE = 100_000_000
+
+# Elements shown at each end of a summarized array
+SUMMARY_EDGE = 3
+
+# Operators simpleeval guards for scalars, with their plain array versions
+ARRAY_OPERATORS = {ast.Add: operator.add, ast.Mult: operator.mul, ast.Pow: operator.pow}
+
+
+def numpy():
+    """Import NumPy on first use."""
+    global np, ARRAY_TYPES
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError("arrays need NumPy: pip install 'figya[fast]'") from None
+        np = numpy
+        ARRAY_TYPES = (numpy.ndarray,)
+        # sqrt(-1..1) or 1/(0..2) show NaN and inf elements; the warnings
+        # NumPy prints about them would only interleave with the output
+        numpy.seterr(divide="ignore", invalid="ignore", over="ignore")
+    return np
+
+
+def is_array(value) -> bool:
+    return isinstance(value, ARRAY_TYPES)
+
+
+def span(start, stop):
+    """start..stop: every number from start to stop inclusive, in steps of 1."""
+    np = numpy()
+    start, stop = float(start), float(stop)
+    # Counted rather than left to arange, whose end overshoots 0.5..3
+    count = max(math.floor(stop - start) + 1, 0)
+    if count > MAX_ARRAY_SIZE:
+        raise ValueError(f"range longer than {MAX_ARRAY_SIZE:,} values")
+    return start + np.arange(count, dtype=float)
+
+
+def linspace(start, stop, count):
+    np = numpy()
+    if count > MAX_ARRAY_SIZE:
+        raise ValueError(f"linspace longer than {MAX_ARRAY_SIZE:,} values")
+    return np.linspace(float(start), float(stop), int(count))
+
+
+def _reduction(name, array_reduce, scalar_reduce):
+    """Reduce one array argument, or several numbers without needing NumPy."""
+    def call(*args):
+        if len(args) == 1 and is_array(args[0]):
+            return float(array_reduce(args[0]))
+        return float(scalar_reduce([float(a) for a in args]))
+    call.__name__ = name
+    return call
+
+
+def _fmean(values):
+    import statistics
+    return statistics.fmean(values)
+
+
+def _median(values):
+    import statistics
+    return statistics.median(values)
+
+
+def _pstdev(values):
+    import statistics
+    return statistics.pstdev(values)
+
+
+def percentile(values, q):
+    np = numpy()
+    return float(np.percentile(values if is_array(values) else [float(values)], float(q)))
+
+
+REDUCTIONS = {
+    "sum": _reduction("sum", lambda a: a.sum(), math.fsum),
+    # statistics is imported on first use; it pulls in decimal and random
+    "mean": _reduction("mean", lambda a: a.mean(), _fmean),
+    "median": _reduction("median", lambda a: np.median(a), _median),
+    "std": _reduction("std", lambda a: a.std(), _pstdev),
+    "percentile": percentile,
+}
+
+ARRAY_BUILDERS = {"span": span, "linspace": linspace}
+
+
+def integral_args(func):
+    """Pass whole-number floats as ints, for factorial, gcd, hex and friends."""
+    def wrapper(*args):
+        return func(*(int(a) if float(a).is_integer() else a for a in args))
+    return wrapper
+
+
+def numpy_functions(functions: dict) -> dict:
+    """NumPy equivalents of math functions; the rest are vectorized as-is."""
+    np = numpy()
+    ufuncs = {
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "asin": np.arcsin,
+        "acos": np.arccos,
+        "atan": np.arctan,
+        "sqrt": np.sqrt,
+        "log": np.log10,
+        "log2": np.log2,
+        "ln": np.log,
+        "exp": np.exp,
+        "abs": np.abs,
+        "round": np.round,
+        "floor": np.floor,
+        "ceil": np.ceil,
+        "degrees": np.degrees,
+        "radians": np.radians,
+        "min": np.minimum,
+        "max": np.maximum,
+    }
+    return {
+        name: ufuncs.get(name) or np.vectorize(integral_args(func))
+        for name, func in functions.items()
+    }
+
+
+def _elementwise(name, scalar, vector):
+    """Call scalar unless an argument is an array."""
+    if name in ("min", "max"):
+        reduce = np.min if name == "min" else np.max
+
+        def call(*args):
+            if not any(isinstance(a, ARRAY_TYPES) for a in args):
+                return scalar(*args)
+            if len(args) == 1:
+                return float(reduce(args[0]))
+            return functools.reduce(vector, args)
+    else:
+        def call(*args):
+            if any(isinstance(a, ARRAY_TYPES) for a in args):
+                return vector(*args)
+            return scalar(*args)
+    return call
+
+
+def array_functions(functions: dict) -> dict:
+    """functions, made to apply elementwise when given arrays."""
+    vectors = numpy_functions({
+        name: func for name, func in functions.items()
+        if name not in REDUCTIONS and name not in ARRAY_BUILDERS
+    })
+    return {
+        name: _elementwise(name, func, vectors[name]) if name in vectors else func
+        for name, func in functions.items()
+    }
+
+
+def array_operator(scalar_op, array_op):
+    """scalar_op (simpleeval's guarded version) unless an operand is an array."""
+    def op(a, b):
+        if isinstance(a, ARRAY_TYPES) or isinstance(b, ARRAY_TYPES):
+            return array_op(a, b)
+        return scalar_op(a, b)
+    return op
+
+
+def as_result(values):
+    """An array result as float64; exact mode can leave object arrays."""
+    if values.dtype.kind in "fc":
+        return values
+    try:
+        return values.astype(float)
+    except (TypeError, ValueError):
+        return values
+
+
+def format_array(values, format_number) -> str:
+    """[first … last] (N values), with format_number applied to each element."""
+    n = len(values)
+    if n > 2 * SUMMARY_EDGE:
+        shown = [format_number(v) for v in values[:SUMMARY_EDGE].tolist()]
+        shown.append("…")
+        shown += [format_number(v) for v in values[-SUMMARY_EDGE:].tolist()]
+    else:
+        shown = [format_number(v) for v in values.tolist()]
+    return f"[{'  '.join(shown)}] ({n:,} value{'s' if n != 1 else ''})"
+
+
+def to_bytes(values) -> bytes:
+    """NumPy's .npy encoding: a small header and the raw buffer."""
+    buffer = io.BytesIO()
+    numpy().save(buffer, values, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def from_bytes(data: bytes):
+    return numpy().load(io.BytesIO(data), allow_pickle=False)
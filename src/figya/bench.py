@@ -0,0 +1,500 @@
+"""`figya bench`: fixed-workload benchmarks for the hot paths."""
+
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from figya import __version__
+
+
+# Seed for every generated workload, so runs are comparable
+SEED = 1234
+
+MATH_EXPRS = [
+    "2 + 2", "sin(pi/4) * 3", "2^10 - 1", "5! / 3", "2pi * 7", "sqrt(2) + ln(10)",
+    "(1 + 2) * (3 + 4) / 5", "max(3, 9, 4) % 7", "log(1000) + log2(8)", "abs(-3.5) * floor(2.7)",
+]
+
+CONVERSIONS = [
+    "5 feet in meters", "100 kg to pounds", "72 fahrenheit in celsius", "3 miles in kilometers",
+    "2 cups to tablespoons", "60 mph in kph", "1 day in seconds", "300 K in degF",
+]
+
+# Lines shaped like conversions that aren't; {} is filled with a counter
+NOT_CONVERSIONS = ["{} apples to oranges", "$n{} in $total", "sqrt({}) in 4", "{} to 5"]
+
+EXACT_EXPRS = ["factorial(300)", "2^200 + 1", "1/3 + 1/7", "7^50000 % 1000", "3^5000", "0.1 * 3"]
+
+ARRAY_EXPRS = ["sum($xs)", "mean(sqrt($xs))", "percentile($xs, 99)", "$xs * 2 + 1", "std($xs ^ 2)"]
+
+FUNCTION_DEFS = ["hyp(a, b) = sqrt(a*a + b*b)", "fv(p, r, n) = p * (1 + r)**n * $k"]
+
+FUNCTION_EXPRS = ["hyp(3, 4)", "hyp($k, 2) + 1", "fv(100, 0.05, 10)", "hyp(fv(1, 0.1, 2), 1)"]
+
+# Formulas run through both engine cases, with the values of their variables
+ENGINE_EXPRS = MATH_EXPRS + [
+    "$p * (1 + $r)^$n - $p", "sqrt($x*$x + $y*$y) / 2", "max($x, $y) % 7 + abs($r)",
+]
+ENGINE_VALUES = {"$p": 100.0, "$r": 0.05, "$n": 10.0, "$x": 3.0, "$y": 4.0}
+
+# Linked variables in the evaluate.recalculate model
+MODEL_SIZE = 500
+
+COMPLETION_PREFIXES = ["s", "si", "sq", "fa", "me", "ki", "c", "de", "$", "$1", "$v", "t"]
+
+# Entries in the history file read by the history.load case
+HISTORY_ENTRIES = 1_000_000
+
+HISTORY_PREFIXES = ["1", "12", "5 f", "$r", "sin(", "99"]
+
+LEXER_LINES = [
+    "$area = pi * $radius^2", "5 feet in meters", "sin(pi/4) + 3! * 2pi",
+    "save project-x", "max($1, $2, $3) / 1e3",
+]
+
+# Entry paths timed as fresh interpreters: (label, argv, stdin)
+COLD_PATHS = [
+    ("-e math", ["-m", "figya", "-e", "2 + 2"], None),
+    ("-e conversion", ["-m", "figya", "-e", "5 feet in meters"], None),
+    ("pipe", ["-m", "figya"], b"2 + 2\n"),
+    ("repl import", ["-c", "import figya.repl"], None),
+]
+
+# Heavy modules a plain -e or pipe run must not import
+_HEAVY = ("pint", "numpy", "prompt_toolkit", "pygments", "gmpy2", "multiprocessing",
+          "sqlite3", "statistics")
+
+# What `figya bench --check` allows each entry path: (median ms, modules it must not load)
+STARTUP_BUDGETS = {
+    "-e math": (60, _HEAVY),
+    "-e conversion": (250, ("prompt_toolkit", "pygments", "multiprocessing", "sqlite3")),
+    "pipe": (60, _HEAVY),
+    "repl import": (150, ("pint", "numpy", "gmpy2", "multiprocessing", "sqlite3")),
+}
+
+
+def _timed(fn, items) -> list[int]:
+    """Call fn on each item, returning per-call durations in nanoseconds."""
+    durations = []
+    clock = time.perf_counter_ns
+    for item in items:
+        start = clock()
+        fn(item)
+        durations.append(clock() - start)
+    return durations
+
+
+def _peak_memory(fn, items) -> int:
+    tracemalloc.start()
+    try:
+        for item in items:
+            fn(item)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _summarize(durations: list[int], peak: int) -> dict:
+    q = statistics.quantiles(durations, n=100) if len(durations) > 1 else durations * 99
+    total = sum(durations)
+    return {
+        "ops": len(durations),
+        "ops_per_sec": len(durations) / (total / 1e9) if total else 0.0,
+        "p50_us": q[49] / 1e3,
+        "p95_us": q[94] / 1e3,
+        "p99_us": q[98] / 1e3,
+        "peak_kib": peak / 1024,
+    }
+
+
+def _run_case(setup, n: int) -> dict:
+    """Time a case. setup() returns (fn, items) and is called fresh per pass."""
+    fn, items = setup()
+    # Warm-up pass so one-time work (pint, caches) isn't in the numbers
+    for item in items[: max(1, n // 10)]:
+        fn(item)
+    durations = _timed(fn, items)
+    fn, items = setup()
+    peak = _peak_memory(fn, items[: max(1, n // 10)])
+    return _summarize(durations, peak)
+
+
+@contextmanager
+def _scratch_data_dir():
+    """Point persistence at a temporary directory, yielded, for the duration."""
+    from figya import persistence
+
+    saved = {
+        name: getattr(persistence, name)
+        for name in ("AUTOSAVE_FILE", "JOURNAL_FILE", "WORKSPACES_DIR", "WORKSPACES_DB")
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, path in saved.items():
+            setattr(persistence, name, Path(tmp) / path.name)
+        try:
+            yield Path(tmp)
+        finally:
+            for name, path in saved.items():
+                setattr(persistence, name, path)
+
+
+def _filled_store(size: int):
+    from figya.variables import VariableStore
+
+    rng = random.Random(SEED)
+    variables = VariableStore()
+    for i in range(size):
+        variables.add_result(rng.uniform(-1e6, 1e6))
+        if i % 100 == 0:
+            variables.set(f"$v{i}", float(i))
+    variables.take_changes()
+    return variables
+
+
+def _history_file(path: Path, entries: int) -> Path:
+    """Write a FileHistory-format file with the given number of entries."""
+    rng = random.Random(SEED)
+    with open(path, "w") as f:
+        for i in range(entries):
+            expr = rng.choice(MATH_EXPRS + CONVERSIONS)
+            f.write(f"\n# 2024-01-01 00:00:00.{i % 1000000:06d}\n+{expr} + {i}\n")
+    return path
+
+
+def _cases(n: int, data_dir: Path) -> dict:
+    from figya.evaluator import Evaluator, format_number
+    from figya.variables import VariableStore
+
+    rng = random.Random(SEED)
+
+    def evaluate():
+        evaluator = Evaluator(VariableStore())
+        return evaluator.evaluate, [MATH_EXPRS[i % len(MATH_EXPRS)] for i in range(n)]
+
+    def conversion():
+        evaluator = Evaluator(VariableStore())
+        return evaluator._try_unit_conversion, [
+            CONVERSIONS[i % len(CONVERSIONS)] for i in range(n)
+        ]
+
+    def not_conversion():
+        evaluator = Evaluator(VariableStore())
+        # Loads pint, so the numbers compare against asking it every time
+        evaluator._try_unit_conversion(CONVERSIONS[0])
+        return evaluator._try_unit_conversion, [
+            NOT_CONVERSIONS[i % len(NOT_CONVERSIONS)].format(i) for i in range(n)
+        ]
+
+    def references():
+        evaluator = Evaluator(VariableStore())
+        for i in range(200):
+            evaluator.variables.add_result(float(i))
+        refs = [" + ".join(f"${j}" for j in range(1, depth + 1)) for depth in (1, 10, 50, 200)]
+        return evaluator.compute, [refs[i % len(refs)] for i in range(n)]
+
+    def exact():
+        evaluator = Evaluator(VariableStore(), exact=True)
+        return evaluator.evaluate, [EXACT_EXPRS[i % len(EXACT_EXPRS)] for i in range(n)]
+
+    def array_ops():
+        evaluator = Evaluator(VariableStore())
+        evaluator.evaluate("$xs = 1..1e5")
+        return evaluator.compute, [ARRAY_EXPRS[i % len(ARRAY_EXPRS)] for i in range(max(1, n // 10))]
+
+    def functions():
+        evaluator = Evaluator(VariableStore())
+        evaluator.evaluate("$k = 2")
+        for definition in FUNCTION_DEFS:
+            evaluator.evaluate(definition)
+        return evaluator.compute, [FUNCTION_EXPRS[i % len(FUNCTION_EXPRS)] for i in range(n)]
+
+    def pipe_block():
+        from figya.pipe import Output, run_pipe
+
+        evaluator = Evaluator(VariableStore())
+        output = Output("jsonl", out=open(os.devnull, "w"))
+        # One block of distinct lines, like a large piped file
+        blocks = [[(i * 100 + j + 1, f"{i * 100 + j} * 1.5 + {j}") for j in range(100)]
+                  for i in range(max(1, n // 100))]
+        return (lambda block: run_pipe([block], evaluator.variables, evaluator, output)), blocks
+
+    def recalculate():
+        # A spreadsheet-like model: a chain of formulas plus a fan-out from the root
+        evaluator = Evaluator(VariableStore(), reactive=True)
+        evaluator.evaluate("$m0 = 1")
+        for i in range(1, MODEL_SIZE):
+            ref = f"$m{i - 1}" if i % 5 else "$m0"
+            evaluator.evaluate(f"$m{i} = {ref} * 1.01 + sqrt($m0)")
+        return evaluator.evaluate, [f"$m0 = {i % 97 + 1}" for i in range(max(1, n // 100))]
+
+    def _engine_exprs():
+        from figya.tokenizer import to_python, tokenize
+
+        engine = Evaluator._build_engine()
+        parsed = []
+        for expr in ENGINE_EXPRS:
+            source, slots = to_python(tokenize(expr))
+            args = {slot: ENGINE_VALUES[name] for name, slot in slots}
+            parsed.append((source, engine.parse(source), args))
+        return engine, parsed
+
+    def tree_walk():
+        # What every evaluation cost before compiling: SimpleEval.eval on a parsed tree
+        engine, parsed = _engine_exprs()
+
+        def step(item):
+            source, node, args = item
+            engine.names.update(args)
+            return engine.eval(source, previously_parsed=node)
+
+        return step, [parsed[i % len(parsed)] for i in range(n)]
+
+    def compiled():
+        from figya.compiler import compile_expression
+
+        engine, parsed = _engine_exprs()
+        functions = [
+            (compile_expression(node, list(args), engine.operators, engine.functions,
+                                engine.names), tuple(args.values()))
+            for _, node, args in parsed
+        ]
+        return (lambda item: item[0](*item[1])), [functions[i % len(functions)] for i in range(n)]
+
+    def format_numbers():
+        values = [rng.choice((rng.uniform(-1e9, 1e9), float(rng.randint(0, 10**12)), 1 / 3))
+                  for _ in range(n)]
+        return format_number, values
+
+    def autosave_cycle():
+        from figya.persistence import autosave
+
+        variables = _filled_store(n)
+
+        def step(value):
+            variables.add_result(value)
+            autosave(variables)
+
+        return step, [float(i) for i in range(max(1, n // 10))]
+
+    def autoload_store():
+        from figya.persistence import autoload, autosave
+
+        variables = _filled_store(n)
+        # Marking the store as replaced makes autosave write a full snapshot
+        variables.from_dict(variables.to_dict())
+        autosave(variables)
+        return (lambda _: autoload(VariableStore())), list(range(20))
+
+    def completions():
+        from prompt_toolkit.document import Document
+        from figya.completions import FigyaCompleter
+
+        variables = _filled_store(n)
+        # Loading the registry makes sure the unit index exists
+        Evaluator(variables).preload().join()
+        completer = FigyaCompleter(variables)
+        docs = [Document(COMPLETION_PREFIXES[i % len(COMPLETION_PREFIXES)]) for i in range(n)]
+        return (lambda doc: list(completer.get_completions(doc, None))), docs
+
+    def workspace_restore():
+        from figya.workspacedb import WorkspaceDB
+
+        db = WorkspaceDB(data_dir / "workspaces.db")
+        db.save("bench", _filled_store(n))
+
+        def step(_):
+            variables = VariableStore()
+            db.restore("bench", variables)
+            # First access loads the values
+            variables.get("$1")
+
+        return step, list(range(20))
+
+    history_path = None
+
+    def history_load():
+        from figya.history import BoundedHistory
+
+        nonlocal history_path
+        if history_path is None:
+            history_path = _history_file(data_dir / "history", HISTORY_ENTRIES)
+        # Everything REPL startup does with the history: read it and index it
+        return (lambda _: BoundedHistory(history_path).suggest("2")), list(range(20))
+
+    def history_suggest():
+        from figya.history import BoundedHistory
+
+        history = BoundedHistory(_history_file(data_dir / "history-small", 20000))
+        history.suggest("")
+        return history.suggest, [HISTORY_PREFIXES[i % len(HISTORY_PREFIXES)] for i in range(n)]
+
+    def lexer():
+        from figya.highlighting import FigyaLexer
+
+        lex = FigyaLexer()
+        lines = [LEXER_LINES[i % len(LEXER_LINES)] for i in range(n)]
+        return (lambda line: list(lex.get_tokens(line))), lines
+
+    return {
+        "evaluate.math": evaluate,
+        "evaluate.conversion": conversion,
+        "evaluate.not_conversion": not_conversion,
+        "evaluate.references": references,
+        "evaluate.exact": exact,
+        "evaluate.arrays": array_ops,
+        "evaluate.functions": functions,
+        "evaluate.recalculate": recalculate,
+        "engine.simpleeval": tree_walk,
+        "engine.compiled": compiled,
+        "pipe.block": pipe_block,
+        "format_number": format_numbers,
+        "autosave": autosave_cycle,
+        "autoload": autoload_store,
+        "completer.get_completions": completions,
+        "workspace.restore": workspace_restore,
+        "history.load": history_load,
+        "history.suggest": history_suggest,
+        "lexer.get_tokens": lexer,
+    }
+
+
+def _imports(argv, stdin, env) -> tuple[list[str], float]:
+    """Modules a fresh interpreter imports for argv, and their total import time in ms.
+
+    Read from -X importtime, so the interpreter's own startup modules are
+    included and the time is that of the top-level imports only.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], input=stdin, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    modules = set()
+    total_us = 0
+    for line in proc.stderr.decode().splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        # Nested imports are indented past the one space after the bar
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return sorted(modules), total_us / 1000
+
+
+def _cold_start(runs: int) -> dict:
+    """Wall time of fresh interpreters for each entry path, in milliseconds."""
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, FIGYA_DATA_DIR=data_dir)
+        src = str(Path(__file__).resolve().parent.parent)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+        for label, argv, stdin in COLD_PATHS:
+            timings = []
+            # One untimed run fills the pint cache like a normal install would
+            for i in range(runs + 1):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, *argv], input=stdin, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                if i:
+                    timings.append((time.perf_counter() - start) * 1000)
+            modules, import_ms = _imports(argv, stdin, env)
+            results[f"cold_start.{label}"] = {
+                "runs": runs,
+                "median_ms": statistics.median(timings),
+                "max_ms": max(timings),
+                "import_ms": import_ms,
+                "modules": modules,
+            }
+    return results
+
+
+def check_startup(report: dict, baseline: dict | None = None) -> list[str]:
+    """Startup budget overruns in a report; empty if every entry path is within budget.
+
+    Against a baseline, any module an entry path imports that it didn't
+    before counts as an overrun too, so new imports are a deliberate choice.
+    """
+    problems = []
+    old = (baseline or {}).get("results", {})
+    for label, (budget_ms, forbidden) in STARTUP_BUDGETS.items():
+        name = f"cold_start.{label}"
+        r = report["results"].get(name)
+        if r is None:
+            continue
+        if r["median_ms"] > budget_ms:
+            problems.append(f"{label}: {r['median_ms']:.1f} ms, budget {budget_ms} ms")
+        loaded = set(r["modules"])
+        heavy = [m for m in forbidden if m in loaded]
+        if heavy:
+            problems.append(f"{label}: imports {', '.join(heavy)}")
+        before = old.get(name, {}).get("modules")
+        if before is not None:
+            new = sorted(loaded - set(before))
+            if new:
+                shown = ", ".join(new[:8]) + (f" and {len(new) - 8} more" if len(new) > 8 else "")
+                problems.append(f"{label}: {len(new)} new modules: {shown}")
+    return problems
+
+
+def run(n: int = 5000, cold_runs: int = 10, only: str | None = None) -> dict:
+    """Run every benchmark and return the results as a JSON-ready dict."""
+    results = {}
+    with _scratch_data_dir() as data_dir:
+        for name, setup in _cases(n, data_dir).items():
+            if only and only not in name:
+                continue
+            results[name] = _run_case(setup, n)
+    if not only or only in "cold_start":
+        results.update(_cold_start(cold_runs))
+    return {
+        "figya": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "n": n,
+        "results": results,
+    }
+
+
+def format_report(report: dict, baseline: dict | None = None) -> str:
+    lines = [f"  figya {report['figya']}, python {report['python']}, n={report['n']}"]
+    old = (baseline or {}).get("results", {})
+    for name, r in report["results"].items():
+        if "ops_per_sec" in r:
+            line = (f"  {name:<28} {r['ops_per_sec']:>12,.0f} ops/s"
+                    f"  p50 {r['p50_us']:>9.1f}us  p99 {r['p99_us']:>9.1f}us"
+                    f"  peak {r['peak_kib']:>9,.0f} KiB")
+            before = old.get(name, {}).get("ops_per_sec")
+        else:
+            line = (f"  {name:<28} median {r['median_ms']:>8.1f} ms  max {r['max_ms']:>8.1f} ms"
+                    f"  imports {r['import_ms']:>6.1f} ms ({len(r['modules'])} modules)")
+            before = old.get(name, {}).get("median_ms")
+        if before:
+            now = r.get("ops_per_sec") or r["median_ms"]
+            ratio = now / before if "ops_per_sec" in r else before / now
+            line += f"  ({ratio:.2f}x vs baseline)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(args):
+    only = "cold_start" if args.check else args.only
+    report = run(n=args.n, cold_runs=args.cold_runs, only=only)
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print(format_report(report, baseline))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if args.check:
+        problems = check_startup(report, baseline)
+        for problem in problems:
+            print(f"  over budget: {problem}")
+        if problems:
+            sys.exit(1)
+        print("  startup within budget")
@@ -0,0 +1,223 @@
+"""Bounded evaluation: expressions that can run away go to a worker process.
+
+Most lines evaluate in-process in microseconds. Lines that could take
+unbounded time or memory (powers with computed exponents, big factorials,
+ranges, very large bound integers) are sent to a worker process that has a
+memory limit, and killed if they outlast the time limit or Ctrl-C is
+pressed.
+"""
+
+import ast
+import math
+import operator
+from fractions import Fraction
+
+from figya.config import EVAL_MEMORY_MB, EVAL_TIMEOUT
+
+
+# Exponents up to this (as a constant, like 2 or 1+1) evaluate in-process
+SAFE_EXPONENT = 64
+
+# Constant powers and factorials whose result fits in this many bits, too
+SAFE_BITS = 100_000
+
+# Bound integers larger than this send the expression to the worker
+HUGE_INT_BITS = 1_000_000
+
+# Functions that can allocate or loop without bound
+RISKY_FUNCTIONS = {"factorial", "span", "linspace", "lcm"}
+
+# lcm calls with up to this many arguments, whose constants total at most
+# SAFE_BITS, evaluate in-process
+SAFE_LCM_ARGS = 32
+
+# Operators folded when both sides are constants, besides small powers
+_FOLDED_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+}
+
+
+def _literal(node):
+    """The value of a constant subexpression such as -2 or (1+1)*3, else None.
+
+    Powers are folded only when their result is small, so folding can't
+    itself run away.
+    """
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return value if type(value) in (int, float) else None
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _literal(node.operand)
+        if value is None:
+            return None
+        return -value if isinstance(node.op, ast.USub) else value
+    if not isinstance(node, ast.BinOp):
+        return None
+    left, right = _literal(node.left), _literal(node.right)
+    if left is None or right is None:
+        return None
+    try:
+        if isinstance(node.op, (ast.Pow, ast.BitXor)):
+            if abs(right) > SAFE_BITS or abs(right) * math.log2(abs(left) or 1) > SAFE_BITS:
+                return None
+            return left ** right
+        op = _FOLDED_OPERATORS.get(type(node.op))
+        return None if op is None else op(left, right)
+    except (ArithmeticError, ValueError):
+        return None
+
+
+def _bits(value) -> int:
+    return value.bit_length() if type(value) is int else 64
+
+
+def _safe_power(node: ast.BinOp) -> bool:
+    exponent = _literal(node.right)
+    if exponent is None:
+        return False
+    if abs(exponent) <= SAFE_EXPONENT:
+        return True
+    base = _literal(node.left)
+    if base is None or abs(exponent) > SAFE_BITS:
+        return False
+    return abs(exponent) * math.log2(abs(base) or 1) <= SAFE_BITS
+
+
+def _safe_call(node: ast.Call) -> bool:
+    name = node.func.id if isinstance(node.func, ast.Name) else None
+    if name not in RISKY_FUNCTIONS:
+        return True
+    if name == "factorial" and len(node.args) == 1:
+        n = _literal(node.args[0])
+        # log2(n!) < n log2(n)
+        return (type(n) is int or type(n) is float and n.is_integer()) and (
+            0 <= n and n * math.log2(n or 1) <= SAFE_BITS)
+    if name == "lcm" and len(node.args) <= SAFE_LCM_ARGS and not any(
+            isinstance(arg, ast.Starred) for arg in node.args):
+        # Other arguments are variables (checked by size when bound) or
+        # expressions is_risky looks at on their own
+        literals = [_literal(arg) for arg in node.args]
+        return sum(_bits(v) for v in literals if v is not None) <= SAFE_BITS
+    return False
+
+
+def is_risky(node) -> bool:
+    """True if evaluating the parsed expression could run away."""
+    for child in ast.walk(node):
+        if isinstance(child, ast.BinOp):
+            if isinstance(child.op, (ast.Pow, ast.BitXor, ast.LShift)) and not _safe_power(child):
+                return True
+        elif isinstance(child, ast.Call):
+            if not _safe_call(child):
+                return True
+    return False
+
+
+def has_huge_values(values) -> bool:
+    return any(type(v) is int and v.bit_length() > HUGE_INT_BITS for v in values)
+
+
+def transferable(values) -> bool:
+    """True if the values can be sent to the worker.
+
+    Quantities belong to this process's unit registry, so expressions using
+    them stay in-process.
+    """
+    from figya import arrays
+    return all(
+        isinstance(v, (int, float, str, Fraction)) or arrays.is_array(v) for v in values
+    )
+
+
+def _serve(conn, memory_mb: int):
+    """Worker loop: evaluate (expr, {$name: value}, exact, functions) requests."""
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    from figya.evaluator import Evaluator
+    from figya.variables import VariableStore
+
+    evaluator = Evaluator(VariableStore())
+    while True:
+        try:
+            expr, refs, exact, functions = conn.recv()
+        except EOFError:
+            return
+        # from_dict binds $_ on its own; set() would make each ref the last value
+        evaluator.variables = VariableStore()
+        evaluator.variables.from_dict({"vars": refs, "functions": functions})
+        evaluator.exact = exact
+        try:
+            reply = (True, evaluator._eval_expression(expr))
+        except MemoryError:
+            reply = (False, f"out of memory (limit {memory_mb} MB)")
+        except Exception as e:
+            reply = (False, str(e))
+        try:
+            conn.send(reply)
+        except MemoryError:
+            conn.send((False, f"out of memory (limit {memory_mb} MB)"))
+
+
+class Budget:
+    """A time and memory limit for risky evaluations, enforced by a worker.
+
+    The worker is started on first use (or by start() ahead of time) and
+    replaced after it is killed.
+    """
+
+    def __init__(self, timeout: float = EVAL_TIMEOUT, memory_mb: int = EVAL_MEMORY_MB):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._process = None
+        self._conn = None
+
+    def start(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        # Imported here: -e and pipe runs rarely need a worker
+        import multiprocessing
+
+        # spawn: the REPL has threads running, which fork doesn't get along with
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_serve, args=(child, self.memory_mb), name="figya-eval", daemon=True,
+        )
+        self._process.start()
+        child.close()
+
+    def stop(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+            self._process = self._conn = None
+
+    def run(self, expr: str, refs: dict, exact: bool, functions: dict | None = None):
+        """Evaluate expr in the worker, raising ValueError on timeout or Ctrl-C.
+
+        functions are the user-defined functions expr may call, as
+        name -> (params, body).
+        """
+        self.start()
+        try:
+            self._conn.send((expr, refs, exact, functions or {}))
+            if not self._conn.poll(self.timeout):
+                self.stop()
+                raise ValueError(f"timed out after {self.timeout:g} s")
+            ok, payload = self._conn.recv()
+        except KeyboardInterrupt:
+            self.stop()
+            raise ValueError("cancelled") from None
+        except (EOFError, OSError):
+            self.stop()
+            raise ValueError(f"evaluation failed (memory limit {self.memory_mb} MB?)") from None
+        if not ok:
+            raise ValueError(payload)
+        return payload
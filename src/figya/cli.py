@@ -2,14 +2,30 @@
 
 import argparse
 import sys
+from typing import TYPE_CHECKING
 
 from figya import __version__
+from figya.config import EVAL_MEMORY_MB, EVAL_TIMEOUT, EXACT, PROFILE, REACTIVE, SOCKET_FILE
 from figya.variables import VariableStore
-from figya.evaluator import Evaluator
-from figya.persistence import autoload, autosave
 
+# Everything heavier is imported by the path that needs it, so `figya -e`
+# loads neither pint nor prompt_toolkit (see STARTUP_BUDGETS in bench.py).
+# The evaluator pulls in simpleeval; it is imported only once `figya -e`
+# knows no daemon will answer.
+if TYPE_CHECKING:
+    from figya.evaluator import Evaluator
 
-def _eval_and_print(expr: str, evaluator: Evaluator):
+
+def _print_reply(reply: dict):
+    """Print a daemon reply the same way _eval_and_print would."""
+    if "error" in reply:
+        print(f"error: {reply['error']}", file=sys.stderr)
+        sys.exit(1)
+    if reply.get("output") is not None:
+        print(reply["output"])
+
+
+def _eval_and_print(expr: str, evaluator: "Evaluator"):
     """Evaluate a single expression and print the result."""
     try:
         result = evaluator.evaluate(expr)
@@ -23,12 +39,96 @@ def _eval_and_print(expr: str, evaluator: Evaluator):
         sys.exit(1)
 
 
+def _map_stdin(expr: str, evaluator: "Evaluator"):
+    """Read a column of numbers from stdin and apply expr to all of them."""
+    from figya.columnar import map_column
+    from figya.evaluator import format_number
+
+    values = []
+    for lineno, line in enumerate(sys.stdin, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            values.append(float(line.replace(",", "")))
+        except ValueError:
+            print(f"error: line {lineno}: not a number: {line!r}", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        results, unit_str = map_column(expr, values, evaluator)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    suffix = f" {unit_str}" if unit_str else ""
+    out = [f"{format_number(value)}{suffix}" for value in results]
+    if out:
+        sys.stdout.write("\n".join(out) + "\n")
+
+
+def _print_timing_summary(evaluator: "Evaluator"):
+    if evaluator.timer is not None:
+        print("timing:", file=sys.stderr)
+        print(evaluator.timer.summary(), file=sys.stderr)
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="figya",
         description="A modern terminal calculator",
     )
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.add_parser("serve", help="keep a warm evaluator running for figya -e")
+    bench = commands.add_parser("bench", help="benchmark the hot paths")
+    bench.add_argument("-n", type=int, default=5000, help="operations per benchmark")
+    bench.add_argument(
+        "--cold-runs", type=int, default=10,
+        help="fresh interpreters per entry path for cold-start timing",
+    )
+    bench.add_argument("--only", metavar="NAME", help="run benchmarks whose name contains NAME")
+    bench.add_argument("--json", metavar="FILE", help="save results as JSON")
+    bench.add_argument("--compare", metavar="FILE", help="show speedup against saved results")
+    bench.add_argument(
+        "--check", action="store_true",
+        help="time only startup, failing if a path is over budget or imports more than --compare",
+    )
     parser.add_argument("-e", "--eval", metavar="EXPR", help="evaluate expression and exit")
+    parser.add_argument(
+        "--map", metavar="EXPR",
+        help="apply EXPR to each number on stdin, bound to $x",
+    )
+    parser.add_argument(
+        "-j", "--jobs", metavar="N", type=int, default=1,
+        help="evaluate piped input across N worker processes",
+    )
+    parser.add_argument(
+        "--format", choices=("text", "jsonl", "csv", "tsv"), default="text",
+        help="output format for piped input: text, or one record per line as "
+             "jsonl, csv or tsv (line, name, value, unit, error)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", default=PROFILE,
+        help="time each evaluation stage (or set FIGYA_PROFILE=1)",
+    )
+    parser.add_argument(
+        "--exact", action="store_true", default=EXACT,
+        help="keep integers and fractions exact (or set FIGYA_EXACT=1)",
+    )
+    parser.add_argument(
+        "--reactive", action="store_true", default=REACTIVE,
+        help="recompute variables when ones they were computed from change "
+             "(or set FIGYA_REACTIVE=1)",
+    )
+    parser.add_argument(
+        "--timeout", metavar="SECONDS", type=float, default=EVAL_TIMEOUT,
+        help="time limit for expressions that could run away, 0 for none "
+             "(or set FIGYA_TIMEOUT; default %(default)g)",
+    )
+    parser.add_argument(
+        "--memory-limit", metavar="MB", type=int, default=EVAL_MEMORY_MB,
+        help="memory limit for those expressions (or set FIGYA_MEMORY_MB; default %(default)d)",
+    )
     parser.add_argument("-V", "--version", action="version", version=f"figya {__version__}")
     parser.add_argument(
         "--about", action="store_true",
@@ -43,36 +143,64 @@ def main():
         print("https://github.com/chris-biagini/figya")
         return
 
+    if args.command == "serve":
+        from figya.daemon import serve
+        serve(timeout=args.timeout, memory_mb=args.memory_limit)
+        return
+
+    if args.command == "bench":
+        from figya import bench
+        bench.main(args)
+        return
+
+    # -e flag: use a running daemon if there is one
+    if args.eval and not args.profile and not args.exact and SOCKET_FILE.exists():
+        from figya.daemon import remote_eval
+        reply = remote_eval(args.eval)
+        if reply is not None:
+            _print_reply(reply)
+            return
+
+    from figya.evaluator import Evaluator
+
     variables = VariableStore()
-    evaluator = Evaluator(variables)
+    evaluator = Evaluator(variables, exact=args.exact, reactive=args.reactive)
+    if args.profile:
+        from figya.timing import StageTimer
+        evaluator.timer = StageTimer()
+    if args.timeout > 0:
+        from figya.budget import Budget
+        evaluator.budget = Budget(args.timeout, args.memory_limit)
 
     # -e flag: evaluate and exit
     if args.eval:
         _eval_and_print(args.eval, evaluator)
         return
 
+    # --map: evaluate once over the whole stdin column
+    if args.map:
+        from figya.persistence import autoload
+        autoload(variables)
+        _map_stdin(args.map, evaluator)
+        return
+
     # Piped input: evaluate each line
     if not sys.stdin.isatty():
-        from figya.commands import handle_command
+        from figya.persistence import autoload, autosave
+        from figya.pipe import Output, read_blocks, run_pipe
         autoload(variables)
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
-                continue
-            # Try commands first
-            cmd_result = handle_command(line, variables)
-            if cmd_result is not None:
-                print(cmd_result.strip())
-                continue
-            try:
-                result = evaluator.evaluate(line)
-                if result is not None:
-                    print(result.strip())
-            except (ValueError, Exception) as e:
-                print(f"error: {e}", file=sys.stderr)
+        output = Output(args.format)
+        if args.jobs > 1:
+            from figya.parallel import run_pipe_parallel
+            run_pipe_parallel(read_blocks(), variables, evaluator, args.jobs, output)
+        else:
+            run_pipe(read_blocks(), variables, evaluator, output)
         autosave(variables)
+        _print_timing_summary(evaluator)
         return
 
     # Interactive REPL
     from figya.repl import run_repl
-    run_repl()
+    run_repl(
+        profile=args.profile, exact=args.exact, budget=evaluator.budget, reactive=args.reactive,
+    )
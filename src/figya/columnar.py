@@ -0,0 +1,140 @@
+"""Columnar mode: apply one expression to a whole column of numbers."""
+
+import ast
+import operator
+
+from simpleeval import SimpleEval
+
+from figya.arrays import array_functions
+from figya.evaluator import Evaluator, MATH_FUNCTIONS, MATH_CONSTANTS, _NOT_AFFINE
+from figya.tokenizer import LPAREN, RPAREN, VARIABLE, scan, to_python, tokenize
+from figya.units import canonical_unit
+
+try:
+    import numpy as np
+except ImportError:  # optional: fall back to evaluating element by element
+    np = None
+
+
+COLUMN_VAR = "$x"
+
+
+def _build_array_engine() -> SimpleEval:
+    s = SimpleEval()
+    s.functions = array_functions(MATH_FUNCTIONS)
+    s.names = dict(MATH_CONSTANTS)
+    # simpleeval's length and exponent guards don't understand arrays;
+    # float64 overflows to inf instead of growing without bound.
+    s.operators[ast.Add] = operator.add
+    s.operators[ast.Mult] = operator.mul
+    s.operators[ast.Pow] = np.power
+    s.operators[ast.BitXor] = np.power
+    return s
+
+
+def _eval_column(expr: str, values, evaluator: Evaluator):
+    """Evaluate a math expression with $x bound to the whole column."""
+    source, slots = to_python(tokenize(expr))
+    column_slot = None
+    bindings = {}
+    for name, slot in slots:
+        if name == COLUMN_VAR:
+            column_slot = slot
+        else:
+            bindings[slot] = evaluator.variables.resolve(name)
+
+    try:
+        if np is not None:
+            s = _build_array_engine()
+            s.names.update(bindings)
+            if column_slot:
+                s.names[column_slot] = values
+            with np.errstate(all="ignore"):
+                result = s.eval(source)
+            return np.broadcast_to(np.asarray(result), values.shape)
+
+        s = Evaluator._build_engine()
+        s.names.update(bindings)
+        node = s.parse(source)
+        results = []
+        for value in values:
+            if column_slot:
+                s.names[column_slot] = value
+            results.append(s.eval(source, previously_parsed=node))
+        return results
+    except Exception as e:
+        raise ValueError(str(e))
+
+
+def _convert_column(magnitudes, from_unit: str, to_unit: str, evaluator: Evaluator):
+    """Convert a column between units. Returns (magnitudes, unit_str)."""
+    from_unit = canonical_unit(from_unit)
+    to_unit = canonical_unit(to_unit)
+
+    factors = evaluator._conversion_factors(from_unit, to_unit)
+    if factors is not _NOT_AFFINE:
+        scale, offset, unit_str = factors
+        if np is not None:
+            return magnitudes * scale + offset, unit_str
+        return [m * scale + offset for m in magnitudes], unit_str
+
+    ureg = evaluator._get_ureg()
+    try:
+        if np is not None:
+            converted = ureg.Quantity(np.asarray(magnitudes, dtype=float), from_unit).to(to_unit)
+            return converted.magnitude, f"{converted.units:~P}"
+        converted = [ureg.Quantity(float(m), from_unit).to(to_unit) for m in magnitudes]
+        unit_str = f"{converted[0].units:~P}" if converted else ""
+        return [c.magnitude for c in converted], unit_str
+    except Exception as e:
+        raise ValueError(str(e))
+
+
+def map_column(expr: str, values: list[float], evaluator: Evaluator) -> tuple[list, str]:
+    """Apply expr to every value, bound to $x. Returns (results, unit_str).
+
+    Math runs once over a NumPy array when NumPy is installed, and
+    '<$x or (expr)> <unit> in <unit>' conversions reuse the evaluator's
+    cached conversion factors or pint's array-valued quantities.
+    """
+    column = np.asarray(values, dtype=float) if np is not None else list(values)
+    line = scan(expr.strip())
+
+    if line.kind == "conversion":
+        split = _split_column_quantity(line)
+        if split is not None:
+            quantity_expr, from_unit = split
+            magnitudes = _eval_column(quantity_expr, column, evaluator)
+            converted, unit_str = _convert_column(magnitudes, from_unit, line.to_text, evaluator)
+            return _to_list(converted), unit_str
+
+    return _to_list(_eval_column(line.text, column, evaluator)), ""
+
+
+def _split_column_quantity(line) -> tuple[str, str] | None:
+    """Split '$x feet' or '($x * 12) inches' into (expression, unit)."""
+    tokens = line.from_tokens
+    first = tokens[0]
+    if first.kind == VARIABLE and first.text == COLUMN_VAR:
+        end = first.end
+    elif first.kind == LPAREN:
+        depth = 0
+        for tok in tokens:
+            depth += (tok.kind == LPAREN) - (tok.kind == RPAREN)
+            if depth == 0:
+                end = tok.end
+                break
+        else:
+            return None
+    else:
+        return None
+    unit = line.line[end:tokens[-1].end].strip()
+    if not unit:
+        return None
+    return line.line[first.start:end], unit
+
+
+def _to_list(results) -> list:
+    if np is not None and isinstance(results, np.ndarray):
+        results = results.tolist()
+    return [r if isinstance(r, str) else float(r) for r in results]
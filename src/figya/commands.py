@@ -1,9 +1,24 @@
-"""REPL commands: help, list, save, restore, delete, clear, quit."""
+"""REPL commands: help, list, save, restore, workspaces, delete, clear, exact, reactive, timing, quit."""
+
+import re
+import time
 
 from figya.variables import VariableStore
-from figya.evaluator import format_number
-from figya.persistence import save_workspace, restore_workspace, delete_workspace, list_workspaces
+from figya.evaluator import Evaluator, format_number
+from figya.persistence import (
+    save_workspace, restore_workspace, delete_workspace, list_workspaces, find_workspaces,
+)
+
+
+COMMAND_NAMES = (
+    "help", "list", "save", "restore", "workspaces", "delete", "clear", "exact", "reactive",
+    "timing", "quit", "exit",
+)
 
+# Results shown per page by `list`
+LIST_PAGE_SIZE = 100
+
+_RANGE_RE = re.compile(r"\$?(\d*)\s*\.\.\s*\$?(\d*)")
 
 HELP_TEXT = """\
   figya — terminal calculator
@@ -20,24 +35,43 @@ HELP_TEXT = """\
     100 kg to pounds
     72 fahrenheit in celsius
 
+  Arrays (needs NumPy):
+    $xs = 1..1e6       range, inclusive
+    linspace(0, 1, 5)  evenly spaced values
+    sqrt($xs) * 2      functions and operators work elementwise
+    sum($xs)           also mean, median, std, percentile($xs, 90)
+
   Variables:
     $radius = 5        named variable
     $1, $2, ...        auto-named results
     $_                 last result
 
+  Functions:
+    hyp(a, b) = sqrt(a*a + b*b)
+    hyp(3, 4)          call it like a built-in
+    delete hyp         delete a function
+
   Commands:
     help               this message
-    list               show all variables
+    list               show variables (the latest results if there are many)
+    list $100..$200    show a range of results
+    list page <n>      show results $1..$100, $101..$200, ...
     save <name>        save workspace
     restore <name>     restore workspace
-    delete $var        delete a variable
+    workspaces [text]  saved workspaces, optionally those matching text
+    delete $var        delete a variable (or a function, without the $)
     delete ws <name>   delete a workspace
     clear              clear all variables
+    exact [on|off]     keep integers and fractions exact (2^200, 1/3)
+    reactive [on|off]  recompute $area when $r changes, like a spreadsheet
+    timing             per-stage timings (with --profile)
     quit / exit        quit figya\
 """
 
 
-def handle_command(line: str, variables: VariableStore) -> str | None:
+def handle_command(
+    line: str, variables: VariableStore, evaluator: Evaluator | None = None,
+) -> str | None:
     """Handle a command. Returns output string, or None if not a command."""
     cmd = line.strip().lower()
 
@@ -47,25 +81,49 @@ def handle_command(line: str, variables: VariableStore) -> str | None:
     if cmd == "help":
         return HELP_TEXT
 
-    if cmd == "list":
-        items = variables.items()
-        if not items:
-            return "  no variables"
-        lines = [f"  {name} = {format_number(value)}" for name, value in items]
-        return "\n".join(lines)
+    if cmd == "list" or cmd.startswith("list "):
+        return _list_variables(cmd[5:].strip(), variables)
+
+    if cmd == "timing":
+        timer = evaluator.timer if evaluator is not None else None
+        if timer is None:
+            return "  timing is off; start figya with --profile or FIGYA_PROFILE=1"
+        return timer.report() + "\n\n" + timer.summary()
+
+    if cmd == "exact" or cmd.startswith("exact "):
+        if evaluator is None:
+            return "  exact mode needs an evaluator"
+        arg = cmd[5:].strip()
+        if arg in ("on", "off"):
+            evaluator.exact = arg == "on"
+        elif arg:
+            return "  usage: exact [on|off]"
+        return f"  exact mode {'on' if evaluator.exact else 'off'}"
+
+    if cmd == "reactive" or cmd.startswith("reactive "):
+        if evaluator is None:
+            return "  reactive mode needs an evaluator"
+        arg = cmd[8:].strip()
+        if arg in ("on", "off"):
+            evaluator.reactive = arg == "on"
+        elif arg:
+            return "  usage: reactive [on|off]"
+        return f"  reactive mode {'on' if evaluator.reactive else 'off'}"
 
     if cmd == "clear":
         variables.clear()
         return "  cleared"
 
     if cmd.startswith("delete "):
-        target = cmd[7:].strip()
-        if target.startswith("ws "):
+        target = line.strip()[7:].strip()
+        if target.lower().startswith("ws "):
             ws_name = target[3:].strip()
-            if delete_workspace(ws_name):
+            if delete_workspace(ws_name, variables):
                 return f"  workspace '{ws_name}' deleted"
             return f"  workspace '{ws_name}' not found"
         if not target.startswith("$"):
+            if variables.undefine(target):
+                return f"  {target}() deleted"
             target = f"${target}"
         if variables.delete(target):
             return f"  {target} deleted"
@@ -85,6 +143,18 @@ def handle_command(line: str, variables: VariableStore) -> str | None:
             return "  no saved workspaces"
         return "  workspaces: " + ", ".join(names)
 
+    if cmd == "workspaces" or cmd.startswith("workspaces "):
+        found = find_workspaces(line.strip()[10:].strip())
+        if not found:
+            return "  no saved workspaces"
+        width = max(len(name) for name, _, _ in found)
+        lines = []
+        for name, count, saved_at in found:
+            saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(saved_at))
+            size = f"{count:>8,} vars" if count is not None else " " * 13
+            lines.append(f"  {name:<{width}}  {size}  saved {saved}")
+        return "\n".join(lines)
+
     if cmd.startswith("restore "):
         name = line.strip()[8:].strip()
         if restore_workspace(name, variables):
@@ -92,3 +162,43 @@ def handle_command(line: str, variables: VariableStore) -> str | None:
         return f"  workspace '{name}' not found"
 
     return None
+
+
+def _list_variables(arg: str, variables: VariableStore) -> str:
+    """Output of `list`, `list $a..$b` and `list page <n>`."""
+    named = []
+    last = variables.counter
+    if not arg:
+        named = variables.named()
+        first = max(1, last - LIST_PAGE_SIZE + 1)
+    elif arg.startswith("page"):
+        page = arg[4:].strip()
+        if not page.isdigit() or int(page) < 1:
+            return "  usage: list page <n>"
+        first = (int(page) - 1) * LIST_PAGE_SIZE + 1
+        last = min(last, first + LIST_PAGE_SIZE - 1)
+    else:
+        m = _RANGE_RE.fullmatch(arg)
+        if not m:
+            return "  usage: list [$a..$b | page <n>]"
+        first = int(m.group(1)) if m.group(1) else 1
+        if m.group(2):
+            last = min(last, int(m.group(2)))
+
+    lines = [f"  {name} = {format_number(value)}" for name, value in variables.results(first, last)]
+    for name, value in named:
+        formula = variables.formula(name)
+        if formula is not None and formula[1]:
+            lines.append(f"  {name} = {format_number(value)}  ({formula[0]})")
+        else:
+            lines.append(f"  {name} = {format_number(value)}")
+    if not arg:
+        lines += [
+            f"  {name}({', '.join(params)}) = {body}"
+            for name, (params, body) in sorted(variables.functions().items())
+        ]
+    if not arg and first > 1:
+        lines.insert(0, f"  showing ${first}..${last}; list $a..$b or list page <n> for earlier results")
+    if not lines:
+        return "  no variables" if not arg else "  no results in that range"
+    return "\n".join(lines)
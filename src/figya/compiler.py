@@ -0,0 +1,163 @@
+"""Compile parsed expressions to Python functions, for lines evaluated repeatedly.
+
+SimpleEval walks the tree node by node on every evaluation. An expression
+made only of whitelisted nodes can instead be turned into a lambda taking
+its variable slots as arguments, compiled once and run as bytecode.
+
+The whitelist is narrower than SimpleEval's: numeric literals, known
+names, the operators and functions the engine has at compile time, and
+comparisons, and/or and if/else. Guarded operators (+, *, ** and the
+others simpleeval limits) are called as the engine's own functions, so
+every limit still applies. Plain ones compile to the native operator.
+Anything else (attributes, subscripts, strings, unknown names) is left
+to SimpleEval, which also reports the error.
+"""
+
+import ast
+import operator
+
+from simpleeval import DISALLOW_FUNCTIONS
+
+
+# Operators that compile to themselves when the engine uses the plain version
+NATIVE_OPERATORS = {
+    ast.Sub: operator.sub,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.BitOr: operator.or_,
+    ast.BitAnd: operator.and_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Not: operator.not_,
+    ast.Invert: operator.invert,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# Literal types compiled inline; Fractions (exact mode) are passed in as globals
+_INLINE_CONSTANTS = (int, float, complex)
+
+
+class NotCompilable(Exception):
+    """The expression uses something outside the whitelist."""
+
+
+class _Builder:
+    """Rebuild a tree from whitelisted nodes, moving objects into globals."""
+
+    def __init__(self, params, operators: dict, functions: dict, names: dict):
+        self.params = set(params)
+        self.operators = operators
+        self.functions = functions
+        self.names = names
+        self.globals = {"__builtins__": {}}
+        self._ids = {}
+
+    def _global(self, value) -> ast.Name:
+        # One global per object; ids are never valid variable slots
+        name = self._ids.get(id(value))
+        if name is None:
+            name = self._ids[id(value)] = f"_g{len(self._ids)}"
+            self.globals[name] = value
+        return ast.Name(name, ast.Load())
+
+    def _native(self, op) -> bool:
+        native = NATIVE_OPERATORS.get(type(op))
+        if native is None:
+            return False
+        try:
+            return self.operators[type(op)] is native
+        except KeyError:
+            raise NotCompilable(type(op).__name__) from None
+
+    def _operator(self, op):
+        try:
+            return self.operators[type(op)]
+        except KeyError:
+            raise NotCompilable(type(op).__name__) from None
+
+    def build(self, node):
+        method = getattr(self, f"_{type(node).__name__}", None)
+        if method is None:
+            raise NotCompilable(type(node).__name__)
+        return method(node)
+
+    def _Expression(self, node):
+        return self.build(node.body)
+
+    def _Expr(self, node):
+        return self.build(node.value)
+
+    def _Constant(self, node):
+        value = node.value
+        if type(value) in _INLINE_CONSTANTS:
+            return ast.Constant(value)
+        if hasattr(value, "__len__"):
+            # Strings keep SimpleEval's length check
+            raise NotCompilable("str")
+        return self._global(value)
+
+    def _Name(self, node):
+        if node.id in self.params:
+            return ast.Name(node.id, ast.Load())
+        try:
+            return self._global(self.names[node.id])
+        except KeyError:
+            raise NotCompilable(node.id) from None
+
+    def _BinOp(self, node):
+        left, right = self.build(node.left), self.build(node.right)
+        if self._native(node.op):
+            return ast.BinOp(left, node.op, right)
+        return ast.Call(self._global(self._operator(node.op)), [left, right], [])
+
+    def _UnaryOp(self, node):
+        operand = self.build(node.operand)
+        if self._native(node.op):
+            return ast.UnaryOp(node.op, operand)
+        return ast.Call(self._global(self._operator(node.op)), [operand], [])
+
+    def _Compare(self, node):
+        # Chained comparisons short-circuit the same way in both evaluators
+        if not all(self._native(op) for op in node.ops):
+            raise NotCompilable("comparison")
+        return ast.Compare(self.build(node.left), node.ops,
+                           [self.build(c) for c in node.comparators])
+
+    def _BoolOp(self, node):
+        return ast.BoolOp(node.op, [self.build(v) for v in node.values])
+
+    def _IfExp(self, node):
+        return ast.IfExp(self.build(node.test), self.build(node.body), self.build(node.orelse))
+
+    def _Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise NotCompilable("call")
+        func = self.functions.get(node.func.id)
+        if func is None or func in DISALLOW_FUNCTIONS:
+            raise NotCompilable(node.func.id)
+        if any(isinstance(arg, ast.Starred) for arg in node.args):
+            raise NotCompilable("*args")
+        return ast.Call(self._global(func), [self.build(arg) for arg in node.args], [])
+
+
+def compile_expression(node, params, operators: dict, functions: dict, names: dict):
+    """A function of params evaluating node like SimpleEval would.
+
+    operators, functions and names are the engine's, and are looked up
+    now, so the result must be recompiled when any of them changes.
+    Raises NotCompilable if node falls outside the whitelist.
+    """
+    builder = _Builder(params, operators, functions, names)
+    body = builder.build(node)
+    args = ast.arguments(
+        posonlyargs=[], args=[ast.arg(p) for p in params], kwonlyargs=[], kw_defaults=[],
+        defaults=[],
+    )
+    tree = ast.fix_missing_locations(ast.Expression(ast.Lambda(args, body)))
+    return eval(compile(tree, "<figya>", "eval"), builder.globals)
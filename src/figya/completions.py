@@ -1,11 +1,19 @@
 """Tab completion for prompt_toolkit."""
 
+import heapq
+import re
+from bisect import bisect_left
+
 from prompt_toolkit.completion import Completer, Completion
 
+from figya.commands import COMMAND_NAMES
+from figya.persistence import list_workspaces
+from figya.tokenizer import NAME, VARIABLE, tokenize
+from figya.units import unit_index
 from figya.variables import VariableStore
 
 
-# Curated list — common functions, constants, commands, units
+# Curated list — common functions, constants, commands
 COMPLETIONS = [
     # Functions
     "sin(", "cos(", "tan(", "asin(", "acos(", "atan(",
@@ -14,11 +22,17 @@ COMPLETIONS = [
     "factorial(", "degrees(", "radians(",
     "gcd(", "lcm(", "min(", "max(",
     "hex(", "oct(", "bin(",
+    "sum(", "mean(", "median(", "std(", "percentile(", "linspace(",
     # Constants
     "pi", "tau", "inf",
     # Commands
-    "help", "list", "save ", "restore ", "delete ", "clear", "quit", "exit",
-    # Common units
+    "help", "list", "save ", "restore ", "workspaces", "delete ", "clear", "exact", "reactive",
+    "timing",
+    "quit", "exit",
+]
+
+# Units worth offering ahead of the rest of pint's registry
+COMMON_UNITS = [
     "feet", "meters", "inches", "centimeters", "miles", "kilometers",
     "pounds", "kilograms", "ounces", "grams",
     "fahrenheit", "celsius", "kelvin",
@@ -27,28 +41,168 @@ COMPLETIONS = [
     "mph", "kph",
 ]
 
+# Most completions offered for one keystroke
+MAX_COMPLETIONS = 50
+
+# Ranks in the index: lower ones are offered first, whatever their length
+WORD_RANK, COMMON_UNIT_RANK, UNIT_RANK = 0, 1, 2
+
+# Commands whose argument is a workspace name, and the words the mode commands take
+_WORKSPACE_COMMANDS = ("save", "restore", "workspaces")
+_MODE_COMMANDS = ("exact", "reactive")
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_]\w*\Z")
+
+
+def _fuzzy_score(word: str, candidate: str) -> int | None:
+    """Span of the first in-order match of word's characters in candidate.
+
+    None when word is not a subsequence of candidate; smaller is tighter.
+    """
+    pos = first = -1
+    for ch in word:
+        pos = candidate.find(ch, pos + 1)
+        if pos < 0:
+            return None
+        if first < 0:
+            first = pos
+    return pos - first
+
+
+def _fuzzy(word: str, candidates, limit: int, skip=(), ranks=None) -> list[str]:
+    """Best fuzzy matches, ranked by rank, then match span, then length.
+
+    candidates yields (key, text) pairs where key is what word is matched
+    against (lower-cased for case-insensitive matching). ranks maps text
+    to its rank; without it every candidate ranks the same.
+    """
+    scored = []
+    for key, text in candidates:
+        if text in skip:
+            continue
+        score = _fuzzy_score(word, key)
+        if score is not None:
+            rank = ranks[text] if ranks else 0
+            scored.append((rank, score, len(key), key, text))
+    return [text for *_, text in heapq.nsmallest(limit, scored)]
+
+
+class CompletionIndex:
+    """Sorted, case-insensitive index of completion words.
+
+    Lookups bisect to the block of words sharing a prefix, so their cost
+    depends on the number of matches rather than the size of the index.
+    Each word has a rank; matches of a lower rank come first, so sqrt is
+    offered before the one-letter unit symbols that share its s.
+    """
+
+    def __init__(self, words=(), rank: int = WORD_RANK):
+        self._entries: list[tuple[str, str]] = []  # (lower-cased, word), sorted
+        self._ranks: dict[str, int] = {}
+        self.add(words, rank)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, words, rank: int = WORD_RANK):
+        """Index words; one already indexed keeps the rank it was first given."""
+        fresh = []
+        for word in words:
+            if word not in self._ranks:
+                self._ranks[word] = rank
+                fresh.append((word.lower(), word))
+        if fresh:
+            self._entries = sorted(self._entries + fresh)
+
+    def _block(self, prefix: str):
+        """Entries whose lower-cased form starts with prefix, in sorted order."""
+        entries = self._entries
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and entries[i][0].startswith(prefix):
+            yield entries[i]
+            i += 1
+
+    def search(self, word: str, limit: int = MAX_COMPLETIONS) -> list[str]:
+        """Prefix matches by rank then shortest first, topped up with fuzzy matches."""
+        key = word.lower()
+        ranks = self._ranks
+        matches = [text for _, text in heapq.nsmallest(
+            limit, self._block(key),
+            key=lambda entry: (ranks[entry[1]], len(entry[0]), entry[0]))]
+        if len(matches) < limit and len(key) > 1:
+            # Fuzzy candidates share the first letter, which keeps the scan short
+            matches += _fuzzy(key[1:], ((k[1:], t) for k, t in self._block(key[0])),
+                              limit - len(matches), skip=set(matches), ranks=ranks)
+        return matches
+
 
 class FigyaCompleter(Completer):
     def __init__(self, variables: VariableStore):
         self.variables = variables
+        self.index = CompletionIndex(COMPLETIONS)
+        self.index.add(COMMON_UNITS, COMMON_UNIT_RANK)
+        self._units_indexed = False
+
+    def _index_units(self):
+        # Saved by an earlier session, or by the registry loading in the background
+        units = unit_index()
+        if units is not None:
+            self.index.add(
+                (name for name in units.names if _IDENTIFIER_RE.match(name)), UNIT_RANK,
+            )
+            self._units_indexed = True
+
+    def _variable_matches(self, word: str) -> list[str]:
+        matches = ["$_"] if "$_".startswith(word) else []
+        matches += self.variables.names_with_prefix(word, MAX_COMPLETIONS - len(matches))
+        if len(matches) < MAX_COMPLETIONS and len(word) > 2:
+            block = ((name[2:], name) for name in self.variables.names_with_prefix(word[:2]))
+            matches += _fuzzy(word[2:], block, MAX_COMPLETIONS - len(matches), skip=set(matches))
+        return matches
+
+    def _argument_matches(self, command: str, arg: str) -> list[str]:
+        """Completions for a command's argument: workspaces, functions or modes, never units."""
+        if command in _MODE_COMMANDS:
+            candidates = ["on", "off"]
+        elif command in _WORKSPACE_COMMANDS:
+            candidates = list_workspaces()
+        elif command == "delete":
+            if arg.startswith("$"):
+                return self._variable_matches(arg)
+            if arg.startswith("ws "):
+                ws = arg[3:].lstrip()
+                return [f"{arg[:len(arg) - len(ws)]}{name}"
+                        for name in list_workspaces() if name.startswith(ws)]
+            candidates = sorted(self.variables.functions()) + ["ws "]
+        else:
+            return []
+        return [name for name in candidates if name.startswith(arg)][:MAX_COMPLETIONS]
 
     def get_completions(self, document, complete_event):
-        word = document.get_word_before_cursor(WORD=True)
-        if not word:
+        text = document.text_before_cursor
+        command, space, arg = text.lstrip().partition(" ")
+        if space and command.lower() in COMMAND_NAMES:
+            # A workspace name can hold any character, so the argument is
+            # matched as a whole rather than by its last token
+            arg = arg.lstrip()
+            for match in self._argument_matches(command.lower(), arg):
+                yield Completion(match, start_position=-len(arg))
             return
 
-        word_lower = word.lower()
+        tokens = tokenize(text)
+        if not tokens or tokens[-1].kind not in (NAME, VARIABLE):
+            return
+        word = tokens[-1].text
 
-        # Complete variable names
         if word.startswith("$"):
-            for name, _ in self.variables.items():
-                if name.startswith(word):
-                    yield Completion(name, start_position=-len(word))
-            if "$_".startswith(word):
-                yield Completion("$_", start_position=-len(word))
-            return
+            matches = self._variable_matches(word)
+        else:
+            if not self._units_indexed:
+                self._index_units()
+            matches = [
+                f"{name}(" for name in sorted(self.variables.functions()) if name.startswith(word)
+            ]
+            matches += self.index.search(word, MAX_COMPLETIONS - len(matches))
 
-        # Complete from curated list
-        for item in COMPLETIONS:
-            if item.lower().startswith(word_lower):
-                yield Completion(item, start_position=-len(word))
+        for match in matches:
+            yield Completion(match, start_position=-len(word))
@@ -7,8 +7,31 @@ from figya import __version__
 
 VERSION = __version__
 
+# Time each evaluation stage (same as --profile)
+PROFILE = os.environ.get("FIGYA_PROFILE", "") not in ("", "0")
+
+# Keep integers and fractions exact instead of converting to float
+EXACT = os.environ.get("FIGYA_EXACT", "") not in ("", "0")
+
+# Keep assignments' expressions and recompute dependents when a variable changes
+REACTIVE = os.environ.get("FIGYA_REACTIVE", "") not in ("", "0")
+
+# Limits for expressions that could run away (9^9^9); a timeout of 0 turns them off
+EVAL_TIMEOUT = float(os.environ.get("FIGYA_TIMEOUT", "5"))
+EVAL_MEMORY_MB = int(os.environ.get("FIGYA_MEMORY_MB", "2048"))
+
+# Results remembered per user-defined function that reads no variables; 0 for none
+FUNCTION_MEMO_SIZE = int(os.environ.get("FIGYA_MEMO", "1024"))
+
+# Where named workspaces are kept: "json" (a file each) or "sqlite" (one database)
+WORKSPACE_BACKEND = os.environ.get("FIGYA_WORKSPACES", "json").lower()
+
 # XDG-compliant data directory
 DATA_DIR = Path(os.environ.get("FIGYA_DATA_DIR", Path.home() / ".local" / "share" / "figya"))
 AUTOSAVE_FILE = DATA_DIR / "autosave.json"
+JOURNAL_FILE = DATA_DIR / "autosave.journal"
 WORKSPACES_DIR = DATA_DIR / "workspaces"
+WORKSPACES_DB = DATA_DIR / "workspaces.db"
 HISTORY_FILE = DATA_DIR / "history"
+SOCKET_FILE = DATA_DIR / "figya.sock"
+PINT_CACHE_DIR = DATA_DIR / "pint-cache"
@@ -0,0 +1,124 @@
+"""`figya serve`: a warm evaluator behind a Unix socket, and its thin client.
+
+The client half only uses the standard library so `figya -e` can reach a
+running daemon without importing simpleeval or pint.
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+
+from figya.config import SOCKET_FILE
+from figya.variables import VariableStore
+
+
+# How long the client waits on the daemon before evaluating in-process
+CLIENT_TIMEOUT = 5.0
+
+
+def _recv_line(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b"\n"):
+            break
+    return b"".join(chunks)
+
+
+def remote_eval(expr: str) -> dict | None:
+    """Ask a running daemon to evaluate expr.
+
+    Returns the reply ({"output": ...} or {"error": ...}), or None when no
+    daemon answers and the caller should evaluate in-process.
+    """
+    if not hasattr(socket, "AF_UNIX") or not SOCKET_FILE.exists():
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(CLIENT_TIMEOUT)
+            conn.connect(str(SOCKET_FILE))
+            conn.sendall(json.dumps({"eval": expr}).encode() + b"\n")
+            return json.loads(_recv_line(conn))
+    except (OSError, ValueError):
+        return None
+
+
+def _handle(evaluator, request: dict) -> dict:
+    # Each request sees a fresh store, exactly like an in-process `figya -e`;
+    # the evaluator's pint registry and caches stay warm.
+    evaluator.variables = VariableStore()
+    try:
+        result = evaluator.evaluate(request["eval"])
+    except Exception as e:
+        return {"error": str(e)}
+    return {"output": result.strip() if result is not None else None}
+
+
+def _socket_in_use() -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(str(SOCKET_FILE))
+        return True
+    except OSError:
+        return False
+
+
+def serve(timeout: float = 0, memory_mb: int = 0):
+    """Run the daemon in the foreground until interrupted.
+
+    With a timeout, runaway expressions are cut off so one bad request
+    can't stall every client.
+    """
+    from figya.evaluator import Evaluator
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("error: figya serve needs Unix domain sockets", file=sys.stderr)
+        sys.exit(1)
+
+    SOCKET_FILE.parent.mkdir(parents=True, exist_ok=True)
+    if SOCKET_FILE.exists():
+        if _socket_in_use():
+            print(f"error: figya is already serving on {SOCKET_FILE}", file=sys.stderr)
+            sys.exit(1)
+        SOCKET_FILE.unlink()
+
+    evaluator = Evaluator(VariableStore())
+    evaluator._get_ureg()
+    if timeout > 0:
+        from figya.budget import Budget
+        evaluator.budget = Budget(timeout, memory_mb)
+        evaluator.budget.start()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(str(SOCKET_FILE))
+    finally:
+        os.umask(old_umask)
+    server.listen()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"figya serving on {SOCKET_FILE}", file=sys.stderr)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    request = json.loads(_recv_line(conn))
+                    reply = _handle(evaluator, request)
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {"error": f"bad request: {e}"}
+                try:
+                    conn.sendall(json.dumps(reply).encode() + b"\n")
+                except OSError:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        SOCKET_FILE.unlink(missing_ok=True)
@@ -1,11 +1,29 @@
 """Expression routing: units vs math."""
 
+import ast
 import math
 import re
+import threading
+import warnings
+from fractions import Fraction
+from typing import NamedTuple
 
 from simpleeval import SimpleEval, NameNotDefined, FunctionNotDefined
 
-from figya.variables import VariableStore
+from figya import arrays
+from figya.budget import has_huge_values, is_risky, transferable
+from figya.cache import LRUCache
+from figya.compiler import NotCompilable, compile_expression
+from figya.config import PINT_CACHE_DIR
+from figya.exact import (
+    ExactLiterals, exact_div, exact_pow, exact_result, factorial, format_fraction, format_int,
+)
+from figya.functions import UserFunction, compile_function
+from figya.tokenizer import Scan, scan, split_amount, to_python, tokenize
+from figya.units import (
+    UNIT_INDEX_FILE, canonical_unit, index_registry, is_conversion, unit_index,
+)
+from figya.variables import VariableStore, result_number
 
 
 MATH_FUNCTIONS = {
@@ -24,7 +42,7 @@ MATH_FUNCTIONS = {
     "round": round,
     "floor": math.floor,
     "ceil": math.ceil,
-    "factorial": math.factorial,
+    "factorial": factorial,
     "degrees": math.degrees,
     "radians": math.radians,
     "gcd": math.gcd,
@@ -34,6 +52,8 @@ MATH_FUNCTIONS = {
     "hex": hex,
     "oct": oct,
     "bin": bin,
+    **arrays.REDUCTIONS,
+    **arrays.ARRAY_BUILDERS,
 }
 
 MATH_CONSTANTS = {
@@ -43,131 +63,575 @@ MATH_CONSTANTS = {
     "inf": math.inf,
 }
 
-# Pattern for unit conversion: <expr> in|to <unit>
-UNIT_CONVERSION_RE = re.compile(r'^(.+?)\s+(?:in|to)\s+(.+)$', re.IGNORECASE)
-
-
-def _preprocess_factorial(expr: str) -> str:
-    """Convert 5! to factorial(5)."""
-    return re.sub(r'(\d+)!', r'factorial(\1)', expr)
-
-
-def _preprocess_implicit_multiplication(expr: str) -> str:
-    """Convert 2pi to 2*pi, 3sin(x) to 3*sin(x), etc."""
-    # number followed by letter (variable or function)
-    expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', expr)
-    # closing paren followed by opening paren or letter
-    expr = re.sub(r'\)(\()', r')*\1', expr)
-    expr = re.sub(r'\)([a-zA-Z])', r')*\1', expr)
-    return expr
+# Number of distinct expressions whose parsed AST is kept per Evaluator
+PARSE_CACHE_SIZE = 1024
+
+# Evaluations of one expression before it is compiled; compiling costs
+# about as much as ten tree walks, so one-off lines never pay for it
+COMPILE_AFTER = 4
+
+# Number of (from_unit, to_unit) pairs whose conversion factors are kept
+CONVERSION_CACHE_SIZE = 256
+
+# Number of "x in y" lines remembered as not being conversions
+NOT_CONVERSION_CACHE_SIZE = 1024
+
+# Source text of the operators budget.is_risky looks at, besides calls
+_POWER_OPS = ("**", "^", "<<")
+
+# Marks a unit pair whose conversion is not affine (e.g. logarithmic units)
+_NOT_AFFINE = object()
+
+
+class Result(NamedTuple):
+    """An evaluated line: what it was stored as, its value and its display.
+
+    For a function definition the name is the signature and the value is
+    the body. An assignment also lists the variables recomputed because
+    they depend on it, and (name, message) for those that failed.
+    """
+    name: str
+    value: object
+    display: str
+    unit: str = ""
+    updated: tuple["Result", ...] = ()
+    errors: tuple[tuple[str, str], ...] = ()
+
+
+def _build_ureg():
+    """Create a pint UnitRegistry backed by an on-disk cache of parsed definitions.
+
+    The cache lives in a directory named after the pint version, so upgrading
+    pint starts from a fresh cache and stale ones are removed. The
+    registry becomes the shared unit index, saved alongside the cache.
+    """
+    import shutil
+
+    import pint
+
+    cache_dir = PINT_CACHE_DIR / pint.__version__
+    try:
+        if PINT_CACHE_DIR.exists():
+            for stale in PINT_CACHE_DIR.iterdir():
+                if stale == cache_dir or stale == UNIT_INDEX_FILE:
+                    continue
+                if stale.is_dir():
+                    shutil.rmtree(stale, ignore_errors=True)
+                else:
+                    stale.unlink(missing_ok=True)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        ureg = pint.UnitRegistry(cache_folder=cache_dir)
+    except OSError:
+        return pint.UnitRegistry()
+    index_registry(ureg, pint.__version__)
+    return ureg
+
+
+def _with_names(message: str, slots) -> str:
+    """An error message with variable placeholders shown as the $names they stand for."""
+    for name, slot in slots:
+        message = re.sub(rf"\b{slot}\b", lambda _: name, message)
+    return message
+
+
+def _calls_itself(name: str, functions: dict) -> bool:
+    """True if user function name can call itself, directly or through others."""
+    seen = set()
+    stack = list(functions[name].calls)
+    while stack:
+        callee = stack.pop()
+        if callee == name:
+            return True
+        if callee in seen or callee not in functions:
+            continue
+        seen.add(callee)
+        stack.extend(functions[callee].calls)
+    return False
 
 
 class Evaluator:
-    def __init__(self, variables: VariableStore):
+    def __init__(self, variables: VariableStore, exact: bool = False, reactive: bool = False):
         self.variables = variables
+        # Keep each assignment's expression so dependents recompute when it changes
+        self.reactive = reactive
         self._pint_ureg = None
+        self._ureg_lock = threading.Lock()
+        self._engine = self._build_engine()
+        self._float_operators = dict(self._engine.operators)
+        # Built-in functions, replaced by array-aware ones once arrays show up
+        self._base_functions = MATH_FUNCTIONS
+        self._arrays = False
+        # User-defined functions compiled from the store, and the store and
+        # functions_version they were compiled from
+        self._user_functions: dict[str, UserFunction] = {}
+        self._functions_store = None
+        self._functions_version = -1
+        # User functions that can run away, so calls to them go to the budget
+        self._risky_functions: set[str] = set()
+        # Evaluation counts of hot expressions, then their compiled functions
+        self.compiled_cache = LRUCache(PARSE_CACHE_SIZE)
+        self.exact = exact
+        self.parse_cache = LRUCache(PARSE_CACHE_SIZE)
+        self.conversion_cache = LRUCache(CONVERSION_CACHE_SIZE)
+        self.not_conversions = LRUCache(NOT_CONVERSION_CACHE_SIZE)
+        # Optional figya.timing.StageTimer; None keeps evaluation unmeasured
+        self.timer = None
+        # Optional figya.budget.Budget; None evaluates everything in-process
+        self.budget = None
+
+    @staticmethod
+    def _build_engine() -> SimpleEval:
+        """Create the long-lived SimpleEval used for every math expression."""
+        s = SimpleEval()
+        s.functions = MATH_FUNCTIONS
+        s.names = dict(MATH_CONSTANTS)
+        # Remap ^ to power instead of XOR
+        s.operators[ast.BitXor] = lambda a, b: a ** b
+        return s
+
+    @property
+    def exact(self) -> bool:
+        """Whether integers and fractions are kept exact instead of made floats."""
+        return self._exact
+
+    @exact.setter
+    def exact(self, on: bool):
+        self._exact = bool(on)
+        operators = self._engine.operators
+        operators.update(self._float_operators)
+        if self._exact:
+            operators[ast.Div] = exact_div
+            operators[ast.Pow] = operators[ast.BitXor] = exact_pow
+        if self._arrays:
+            for op, array_op in arrays.ARRAY_OPERATORS.items():
+                operators[op] = arrays.array_operator(operators[op], array_op)
+        # User function bodies parse decimals differently in exact mode
+        self._user_functions = {}
+        self._functions_store = None
+        # Compiled expressions hold the operators they were compiled with
+        self.compiled_cache.clear()
+
+    def _enable_arrays(self):
+        """Make functions and guarded operators accept arrays from now on."""
+        self._base_functions = arrays.array_functions(MATH_FUNCTIONS)
+        self._engine.functions = self._base_functions
+        self._arrays = True
+        self.exact = self._exact
+
+    def _resolve(self, name: str):
+        return self.variables.resolve(name)
+
+    def _compile(self, name: str, params: tuple[str, ...], body: str) -> UserFunction:
+        return compile_function(
+            name, params, body, self._engine, self._resolve, MATH_FUNCTIONS, self._exact,
+        )
+
+    def _sync_functions(self):
+        """Register the store's user functions with the engine.
+
+        Runs when the store or its functions change; definitions that are
+        unchanged keep their compiled closures (and memos).
+        """
+        store = self.variables
+        compiled = {}
+        for name, (params, body) in store.functions().items():
+            fn = self._user_functions.get(name)
+            if fn is None or fn.params != params or fn.body != body:
+                try:
+                    fn = self._compile(name, params, body)
+                except ValueError:
+                    # A saved definition that no longer compiles stays undefined
+                    continue
+            compiled[name] = fn
+        self._user_functions = compiled
+        if compiled:
+            functions = dict(self._base_functions)
+            functions.update((name, fn.call) for name, fn in compiled.items())
+            self._engine.functions = functions
+        else:
+            self._engine.functions = self._base_functions
+
+        # Recursion has no bound the tree can show, so any call cycle is risky
+        risky = {
+            name for name, fn in compiled.items()
+            if is_risky(fn.node) or _calls_itself(name, compiled)
+        }
+        grew = True
+        while grew:
+            grew = False
+            for name, fn in compiled.items():
+                if name not in risky and not fn.calls.isdisjoint(risky):
+                    risky.add(name)
+                    grew = True
+        self._risky_functions = risky
+        self._functions_store = store
+        self._functions_version = store.functions_version
+        self.compiled_cache.clear()
+
+    def define(self, name: str, params: tuple[str, ...], body: str):
+        """Define name(params) = body, raising ValueError if it doesn't compile."""
+        fn = self._compile(name, params, body)
+        self.variables.define(name, params, body)
+        self._user_functions[name] = fn
+        self._sync_functions()
+
+    def _parse(self, expr: str, tokens=None):
+        """Parse expr, reusing a cached (AST, variable slots, builds arrays, risky, calls).
+
+        calls holds the names of non-built-in functions the expression calls.
+        """
+        # Exact mode parses decimal literals differently, so cache it apart
+        key = (expr, True) if self._exact else expr
+        entry = self.parse_cache.get(key)
+        if entry is None:
+            source, slots = to_python(tokens if tokens is not None else tokenize(expr))
+            node = self._engine.parse(source)
+            if self._exact:
+                node = ExactLiterals().visit(node)
+            builds_arrays = any(name in source for name in arrays.ARRAY_BUILDERS)
+            # Most lines have no calls or powers; don't walk the tree for them
+            has_calls = "(" in source
+            calls = frozenset(
+                child.func.id for child in ast.walk(node)
+                if isinstance(child, ast.Call) and isinstance(child.func, ast.Name)
+                and child.func.id not in MATH_FUNCTIONS
+            ) if has_calls else frozenset()
+            risky = (has_calls or any(op in source for op in _POWER_OPS)) and is_risky(node)
+            entry = (node, slots, builds_arrays, risky, calls)
+            self.parse_cache.put(key, entry)
+        return entry
+
+    def _compiled(self, expr: str, node, slots):
+        """expr's compiled function once it is hot, or None to walk the tree."""
+        key = (expr, True) if self._exact else expr
+        entry = self.compiled_cache.get(key, 0)
+        if type(entry) is int:
+            if entry + 1 < COMPILE_AFTER:
+                self.compiled_cache.put(key, entry + 1)
+                return None
+            engine = self._engine
+            try:
+                entry = compile_expression(
+                    node, [slot for _, slot in slots],
+                    engine.operators, engine.functions, engine.names,
+                )
+            except (NotCompilable, RecursionError):
+                entry = False
+            self.compiled_cache.put(key, entry)
+        return entry or None
 
     def _get_ureg(self):
         if self._pint_ureg is None:
-            import pint
-            self._pint_ureg = pint.UnitRegistry()
+            with self._ureg_lock:
+                if self._pint_ureg is None:
+                    self._pint_ureg = _build_ureg()
         return self._pint_ureg
 
+    def _routes_to_pint(self, line: Scan) -> bool:
+        """Whether a line scanned as a conversion should be tried with pint.
+
+        Lines pint has already rejected, and lines using words that aren't
+        units, go straight to math. With no unit names saved yet (pint has
+        never been loaded) every conversion-shaped line is tried.
+        """
+        if line.text in self.not_conversions:
+            return False
+        units = unit_index()
+        return units is None or is_conversion(line, units)
+
+    @property
+    def unit_registry(self):
+        """The pint registry if it has been built already, else None."""
+        return self._pint_ureg
+
+    def preload(self) -> threading.Thread:
+        """Build the unit registry in a background thread."""
+        thread = threading.Thread(target=self._get_ureg, name="figya-pint", daemon=True)
+        thread.start()
+        return thread
+
     def evaluate(self, raw_expr: str) -> str | None:
         """Evaluate an expression, return formatted result string or None."""
+        result = self.evaluate_result(raw_expr)
+        if result is None:
+            return None
+        lines = [f"  {result.name} = {result.display}"]
+        lines += [f"  {r.name} = {r.display}" for r in result.updated]
+        lines += [f"  {name}: error: {message}" for name, message in result.errors]
+        return "\n".join(lines)
+
+    def evaluate_result(self, raw_expr: str) -> Result | None:
+        """Evaluate and store an expression, returning a Result or None if blank."""
         expr = raw_expr.strip()
         if not expr:
             return None
 
-        # Check for variable assignment: $name = expr
-        assign_match = re.match(r'^\$([a-zA-Z_]\w*)\s*=\s*(.+)$', expr)
-        if assign_match:
-            var_name = f"${assign_match.group(1)}"
-            value_expr = assign_match.group(2)
-            result = self._eval_expression(value_expr)
-            self.variables.set(var_name, result)
-            return f"  {var_name} = {format_number(result)}"
+        timer = self.timer
+        if timer is None:
+            return self._evaluate(expr)
+        timer.start(expr)
+        ok = False
+        try:
+            result = self._evaluate(expr)
+            ok = True
+            return result
+        finally:
+            timer.finish(ok)
+
+    def _evaluate(self, expr: str) -> Result:
+        timer = self.timer
+
+        # One scan classifies the line: assignment, conversion or math
+        line = scan(expr)
+        if timer:
+            timer.mark("classify")
+        if line.kind == "definition":
+            self.define(line.target, line.params, line.text)
+            if timer:
+                timer.mark("define")
+            return Result(f"{line.target}({', '.join(line.params)})", line.text, line.text)
+        if line.kind == "assignment":
+            var_name = line.target
+            result = self._eval_expression(line.text, line.tokens)
+            formula, refs = None, ()
+            if self.reactive:
+                formula, refs = self._formula(var_name, line)
+            self.variables.set(var_name, result, formula, refs)
+            display = format_number(result)
+            if timer:
+                timer.mark("format")
+            if not self.variables.has_dependents(var_name):
+                return Result(var_name, result, display)
+            updated, errors = self.recalculate(var_name)
+            if timer:
+                timer.mark("recalculate")
+            return Result(var_name, result, display, updated=updated, errors=errors)
+
+        value, display, unit = self.compute(expr)
+        name = self.variables.add_result(value)
+        return Result(name, value, display, unit)
+
+    def _formula(self, name: str, line: Scan) -> tuple[str | None, tuple[str, ...]]:
+        """The formula to keep for an assignment, and the variables it reads.
+
+        Assignments that read $_ or the variable itself ($n = $n + 1) are
+        one-off updates and keep no formula.
+        """
+        refs = []
+        for ref, _ in self._parse(line.text, line.tokens)[1]:
+            if ref == "$_" or ref == name:
+                return None, ()
+            if result_number(ref) is None:
+                refs.append(ref)
+        return line.text, tuple(refs)
+
+    def recalculate(self, name: str) -> tuple[tuple[Result, ...], tuple[tuple[str, str], ...]]:
+        """Recompute the formulas downstream of name, in dependency order.
+
+        Formulas go through the parse cache, so each recompute costs one
+        evaluation. Returns the updated variables and (name, message) for
+        those that failed; anything depending on a failure keeps its value.
+        """
+        variables = self.variables
+        updated = []
+        errors = []
+        failed = set()
+        for dependent in variables.downstream(name):
+            formula, refs = variables.formula(dependent)
+            stale = failed.intersection(refs)
+            if stale:
+                failed.add(dependent)
+                errors.append((dependent, f"not updated, {min(stale)} failed"))
+                continue
+            try:
+                value = self._eval_expression(formula)
+            except ValueError as e:
+                failed.add(dependent)
+                errors.append((dependent, str(e)))
+                continue
+            variables.update(dependent, value)
+            updated.append(Result(dependent, value, format_number(value)))
+        return tuple(updated), tuple(errors)
+
+    def compute(self, expr: str) -> tuple[float, str, str]:
+        """Evaluate a non-assignment expression without storing it.
+
+        Returns (value, formatted_string, unit); the unit is empty for math.
+        """
+        timer = self.timer
+        line = scan(expr)
 
         # Try unit conversion first, then math
-        result = self._try_unit_conversion(expr)
-        if result is not None:
-            name = self.variables.add_result(result[0])
-            return f"  {name} = {result[1]}"
+        if line.kind == "conversion" and self._routes_to_pint(line):
+            result = self._convert(line)
+            if timer:
+                timer.mark("conversion" if result is not None else "conversion_miss")
+            if result is not None:
+                return result
+            self.not_conversions.put(line.text, True)
 
         # Math evaluation
-        value = self._eval_expression(expr)
-        name = self.variables.add_result(value)
-        return f"  {name} = {format_number(value)}"
-
-    def _try_unit_conversion(self, expr: str) -> tuple[float, str] | None:
-        """Try to parse as unit conversion. Returns (numeric_value, formatted_string) or None."""
-        match = UNIT_CONVERSION_RE.match(expr)
-        if not match:
+        value = self._eval_expression(line.text, line.tokens)
+        display = format_number(value)
+        if timer:
+            timer.mark("format")
+        return (value, display, "")
+
+    def _try_unit_conversion(self, expr: str) -> tuple[float, str, str] | None:
+        """Try to parse as unit conversion. Returns (numeric_value, formatted_string, unit) or None."""
+        line = scan(expr)
+        if line.kind != "conversion" or not self._routes_to_pint(line):
             return None
+        return self._convert(line)
 
-        from_expr = match.group(1).strip()
-        to_unit = match.group(2).strip()
-
-        # Friendly aliases for temperature
-        temp_aliases = {
-            "fahrenheit": "degF", "farenheit": "degF", "f": "degF",
-            "celsius": "degC", "centigrade": "degC", "c": "degC",
-            "kelvin": "K",
-        }
-
-        to_unit_mapped = temp_aliases.get(to_unit.lower(), to_unit)
+    def _convert(self, line: Scan) -> tuple[float, str, str] | None:
+        """Convert a line classified as a conversion, or None if pint can't."""
+        to_unit_mapped = canonical_unit(line.to_text)
 
         try:
-            ureg = self._get_ureg()
-
-            # Try to split from_expr into value + unit
-            num_match = re.match(r'^(-?\d+\.?\d*(?:e[+-]?\d+)?)\s*(.+)$', from_expr)
-            if num_match:
-                value = float(num_match.group(1))
-                from_unit = num_match.group(2).strip()
-                from_unit_mapped = temp_aliases.get(from_unit.lower(), from_unit)
+            # Try to split the left side into value + unit
+            amount = split_amount(line)
+            if amount is not None:
+                value, from_unit = amount
+                from_unit_mapped = canonical_unit(from_unit)
+                factors = self._conversion_factors(from_unit_mapped, to_unit_mapped)
+                if factors is not _NOT_AFFINE:
+                    scale, offset, unit_str = factors
+                    magnitude = value * scale + offset
+                    return (magnitude, f"{format_number(magnitude)} {unit_str}", unit_str)
+                ureg = self._get_ureg()
                 quantity = ureg.Quantity(value, from_unit_mapped)
             else:
-                quantity = ureg.parse_expression(from_expr)
+                ureg = self._get_ureg()
+                quantity = ureg.parse_expression(line.from_text)
 
             converted = quantity.to(to_unit_mapped)
             magnitude = converted.magnitude
             # Use friendly unit display
             unit_str = f"{converted.units:~P}"
-            return (float(magnitude), f"{format_number(magnitude)} {unit_str}")
+            return (float(magnitude), f"{format_number(magnitude)} {unit_str}", unit_str)
         except Exception:
             return None
 
-    def _eval_expression(self, expr: str) -> float:
-        """Evaluate a math expression with variable substitution."""
-        # Substitute variables
-        expr = self.variables.substitute(expr)
-
-        # Preprocess
-        expr = _preprocess_factorial(expr)
-        expr = _preprocess_implicit_multiplication(expr)
+    def _conversion_factors(self, from_unit: str, to_unit: str):
+        """Return cached (scale, offset, unit_str) for a unit pair.
+
+        Conversions between pint units are affine, so two probe conversions
+        give the coefficients and a third checks the fit. Pairs that don't fit
+        (logarithmic units) return _NOT_AFFINE and are converted by pint.
+        Pure scalings match pint exactly; with an offset (temperatures) the
+        result can differ from pint's in the last digit or two.
+        """
+        key = (from_unit, to_unit)
+        factors = self.conversion_cache.get(key)
+        if factors is not None:
+            return factors
+
+        ureg = self._get_ureg()
+        try:
+            with warnings.catch_warnings():
+                # Logarithmic units overflow at the far probe; they fail the fit anyway
+                warnings.simplefilter("ignore")
+                zero = ureg.Quantity(0.0, from_unit).to(to_unit)
+                one = ureg.Quantity(1.0, from_unit).to(to_unit)
+                # A distant probe keeps the offset from eating the scale's digits
+                far = float(ureg.Quantity(1e6, from_unit).to(to_unit).magnitude)
+            offset = float(zero.magnitude)
+            scale = (far - offset) / 1e6
+            if math.isclose(float(one.magnitude), scale + offset, rel_tol=1e-9):
+                factors = (scale, offset, f"{one.units:~P}")
+            else:
+                factors = _NOT_AFFINE
+        except Exception:
+            # Let the caller go through pint and report the real error
+            factors = _NOT_AFFINE
 
-        # Build evaluator
-        s = SimpleEval()
-        s.functions = MATH_FUNCTIONS
-        s.names = dict(MATH_CONSTANTS)
+        self.conversion_cache.put(key, factors)
+        return factors
 
-        # Remap ^ to power instead of XOR
-        import ast
-        s.operators[ast.BitXor] = lambda a, b: a ** b
+    def _eval_expression(self, expr: str, tokens=None) -> float:
+        """Evaluate a math expression with variables bound by value."""
+        timer = self.timer
+        names = self._engine.names
+        variables = self.variables
+        if (variables is not self._functions_store
+                or variables.functions_version != self._functions_version):
+            self._sync_functions()
 
         try:
-            result = s.eval(expr)
-        except NameNotDefined as e:
+            node, slots, builds_arrays, risky, calls = self._parse(expr, tokens)
+        except Exception as e:
             raise ValueError(str(e))
+        if timer:
+            timer.mark("parse")
+
+        # $refs are placeholder names in the AST; bind them to their values
+        bindings = {slot: variables.resolve(name) for name, slot in slots}
+        if not self._arrays and (
+                builds_arrays or any(arrays.is_array(v) for v in bindings.values())):
+            try:
+                arrays.numpy()
+            except ValueError:
+                pass
+            else:
+                self._enable_arrays()
+        if timer:
+            timer.mark("bind")
+
+        if self.budget is not None and (
+                risky or has_huge_values(bindings.values())
+                or (calls and not calls.isdisjoint(self._risky_functions))):
+            refs = {name: bindings[slot] for name, slot in slots}
+            functions = {}
+            if calls:
+                # The worker gets every definition and the variables they read
+                functions = variables.functions()
+                for fn in self._user_functions.values():
+                    for name in fn.refs:
+                        if name not in refs and variables.get(name) is not None:
+                            refs[name] = variables.resolve(name)
+            if transferable(refs.values()):
+                result = self.budget.run(expr, refs, self._exact, functions)
+                if timer:
+                    timer.mark("eval_worker")
+                return result
+
+        compiled = self._compiled(expr, node, slots)
+        try:
+            if compiled is not None:
+                # User function bodies report errors against the caller's text
+                self._engine.expr = expr
+                result = compiled(*bindings.values())
+            else:
+                names.update(bindings)
+                try:
+                    # Pass the original text so error messages show $names
+                    result = self._engine.eval(expr, previously_parsed=node)
+                finally:
+                    for slot in bindings:
+                        del names[slot]
+            if timer:
+                timer.mark("eval")
+        except NameNotDefined as e:
+            raise ValueError(_with_names(str(e), slots))
         except FunctionNotDefined as e:
-            raise ValueError(str(e))
+            raise ValueError(_with_names(str(e), slots))
         except Exception as e:
-            raise ValueError(str(e))
+            raise ValueError(_with_names(str(e), slots))
 
         if isinstance(result, str):
             return result
-        return float(result)
+        if arrays.is_array(result):
+            return arrays.as_result(result)
+        if self._exact:
+            return exact_result(result)
+        try:
+            return float(result)
+        except OverflowError:
+            # Integers too large for a float are kept whole
+            if isinstance(result, int):
+                return result
+            raise ValueError("result too large")
 
 
 def format_number(value) -> str:
@@ -186,4 +650,10 @@ def format_number(value) -> str:
         # Use reasonable precision
         formatted = f"{value:,.10g}"
         return formatted
+    if isinstance(value, int):
+        return format_int(value)
+    if isinstance(value, Fraction):
+        return format_fraction(value)
+    if arrays.is_array(value):
+        return arrays.format_array(value, format_number)
     return str(value)
@@ -0,0 +1,148 @@
+"""Exact integer and rational arithmetic, and display of huge numbers.
+
+gmpy2, when installed (`pip install '.[fast]'`), takes over large factorials
+and integer powers; results are always handed back as plain Python ints. It
+is imported the first time one comes up, since importing it costs more than
+a typical expression.
+"""
+
+import ast
+import math
+from fractions import Fraction
+
+
+# Integers with more digits than this are shown in scientific notation
+DISPLAY_DIGITS = 100
+
+# Exponent above which int powers go through gmpy2, when it is installed
+GMPY_POWER_THRESHOLD = 64
+
+# Factorials above this go through gmpy2, when it is installed
+GMPY_FACTORIAL_THRESHOLD = 1000
+
+# The gmpy2 module, False if it isn't installed, None until first needed
+_gmpy2 = None
+
+
+def _gmpy():
+    global _gmpy2
+    if _gmpy2 is None:
+        try:
+            import gmpy2
+        except ImportError:
+            gmpy2 = False
+        _gmpy2 = gmpy2
+    return _gmpy2
+
+_LOG10_2 = math.log10(2)
+
+
+def factorial(n):
+    if type(n) is int and n > GMPY_FACTORIAL_THRESHOLD and _gmpy():
+        return int(_gmpy().fac(n))
+    return math.factorial(n)
+
+
+def exact_div(a, b):
+    """a / b, as a Fraction when both sides are integers or fractions."""
+    if isinstance(a, (int, Fraction)) and isinstance(b, (int, Fraction)):
+        if not b:
+            raise ZeroDivisionError("division by zero")
+        return Fraction(a) / b
+    return a / b
+
+
+def exact_pow(a, b):
+    """a ** b, staying exact for integer and fraction bases."""
+    if type(b) is int and isinstance(a, (int, Fraction)):
+        if b < 0:
+            return Fraction(a) ** b
+        if type(a) is int and b > GMPY_POWER_THRESHOLD and _gmpy():
+            return int(_gmpy().mpz(a) ** b)
+    return a ** b
+
+
+def exact_result(value):
+    """Normalize an exact-mode result: integral fractions become ints."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, Fraction):
+        return value.numerator if value.denominator == 1 else value
+    if isinstance(value, (int, float, str)):
+        return value
+    return float(value)
+
+
+class ExactLiterals(ast.NodeTransformer):
+    """Turn decimal literals like 0.1 into Fractions, so they stay exact."""
+
+    def visit_Constant(self, node):
+        if type(node.value) is float and math.isfinite(node.value):
+            return ast.copy_location(ast.Constant(Fraction(repr(node.value))), node)
+        return node
+
+
+def _digits(n: int) -> int:
+    """Rough decimal digit count of a non-negative int, from its bit length."""
+    return int(n.bit_length() * _LOG10_2) + 1
+
+
+def _log10_floor(n: int, lg: float) -> int:
+    """floor(log10(n)) for a positive int, given lg = math.log10(n).
+
+    lg loses precision for huge n, so an exponent that lands next to an
+    integer is settled exactly.
+    """
+    exp = math.floor(lg)
+    tolerance = max(1.0, lg) * 1e-12
+    if lg - exp < tolerance and n < 10 ** exp:
+        return exp - 1
+    if exp + 1 - lg < tolerance and n >= 10 ** (exp + 1):
+        return exp + 1
+    return exp
+
+
+def _scientific(negative: bool, lg: float, exp: int) -> str:
+    """Mantissa and exponent from a base-10 logarithm.
+
+    The logarithm's absolute error grows with its size, so huge exponents
+    get fewer mantissa digits.
+    """
+    places = max(2, 14 - len(str(exp)))
+    # Truncate rather than round, so 10^100 - 1 doesn't show as 1e+100
+    scale = 10 ** places
+    mantissa = min(math.floor(10 ** (lg - exp) * scale), 10 * scale - 1) / scale
+    text = f"{mantissa:.{places}f}".rstrip("0").rstrip(".")
+    return f"{'-' if negative else ''}{text}e{exp:+d}"
+
+
+def format_int(value: int) -> str:
+    """Integer with thousands separators, or scientific with a digit count.
+
+    Huge values are never converted to decimal in full, so a result with
+    millions of digits displays as fast as a small one.
+    """
+    n = abs(value)
+    if _digits(n) <= DISPLAY_DIGITS:
+        return f"{value:,}"
+    lg = math.log10(n)
+    exp = _log10_floor(n, lg)
+    return f"{_scientific(value < 0, lg, exp)} ({exp + 1:,} digits)"
+
+
+def format_fraction(value: Fraction) -> str:
+    """p/q with its decimal value, or just the value when p or q is huge."""
+    num, den = value.numerator, value.denominator
+    try:
+        approx = float(value)
+    except OverflowError:
+        approx = math.inf
+    if math.isinf(approx) or approx == 0:
+        # Too far from 1 for a float; work from the logarithms instead
+        lg = math.log10(abs(num)) - math.log10(den)
+        decimal = _scientific(num < 0, lg, math.floor(lg))
+    else:
+        decimal = f"{approx:,.10g}"
+    if _digits(abs(num)) > DISPLAY_DIGITS or _digits(den) > DISPLAY_DIGITS:
+        return f"≈ {decimal}"
+    return f"{num}/{den} ≈ {decimal}"
@@ -0,0 +1,118 @@
+"""User-defined functions: f(x, y) = body, compiled once into closures."""
+
+import ast
+import keyword
+
+from figya.cache import LRUCache
+from figya.config import FUNCTION_MEMO_SIZE
+from figya.exact import ExactLiterals
+from figya.tokenizer import to_python, tokenize
+
+
+class UserFunction:
+    """A compiled definition.
+
+    The body is tokenized and parsed once; `call` evaluates the parsed
+    tree with the arguments bound as names, so calling f in a loop costs
+    one tree walk and no parsing.
+    """
+
+    def __init__(self, name: str, params: tuple[str, ...], body: str, call,
+                 node, refs: tuple[str, ...], calls: frozenset, memo: LRUCache | None):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.call = call
+        self.node = node
+        self.refs = refs        # $variables the body reads, at call time
+        self.calls = calls      # functions the body calls, other than built-ins
+        self.memo = memo        # results by arguments, for pure functions
+
+    def __repr__(self) -> str:
+        return f"{self.name}({', '.join(self.params)}) = {self.body}"
+
+
+def check_definition(name: str, params: tuple[str, ...], builtins, constants):
+    """Raise ValueError if name(params) can't be defined."""
+    if keyword.iskeyword(name) or name in builtins:
+        raise ValueError(f"{name} is a built-in function")
+    if name in constants:
+        raise ValueError(f"{name} is a constant")
+    if len(set(params)) != len(params):
+        raise ValueError(f"{name}: repeated parameter")
+    for param in params:
+        if keyword.iskeyword(param):
+            raise ValueError(f"{name}: {param} can't be a parameter")
+
+
+def compile_function(
+    name: str, params: tuple[str, ...], body: str, engine, resolve,
+    builtins, exact: bool = False, memo_size: int = FUNCTION_MEMO_SIZE,
+) -> UserFunction:
+    """Compile a definition against a SimpleEval engine.
+
+    resolve(name) gives the current value of a $variable, so bodies see
+    variables as they are when called. Bodies that read no variables and
+    call only built-in functions are pure, and remember up to memo_size
+    results.
+    """
+    check_definition(name, params, builtins, engine.names)
+    source, slots = to_python(tokenize(body))
+    try:
+        node = engine.parse(source)
+    except Exception as e:
+        raise ValueError(f"{name}: {e}")
+    if exact:
+        node = ExactLiterals().visit(node)
+
+    bound = set(params) | {slot for _, slot in slots}
+    calls = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call) and isinstance(child.func, ast.Name):
+            calls.add(child.func.id)
+        elif isinstance(child, ast.Name) and child.id not in bound \
+                and child.id not in engine.names and child.id not in calls:
+            raise ValueError(f"{name}: unknown name {child.id}")
+    calls = frozenset(calls - set(builtins))
+
+    names = engine.names
+    arity = len(params)
+
+    def call(*args):
+        if len(args) != arity:
+            raise ValueError(f"{name}() takes {arity} argument{'s' if arity != 1 else ''}, "
+                             f"{len(args)} given")
+        bindings = dict(zip(params, args))
+        for var, slot in slots:
+            bindings[slot] = resolve(var)
+        # Arguments may shadow constants or the caller's own bindings
+        saved = {key: names[key] for key in bindings if key in names}
+        names.update(bindings)
+        try:
+            # _eval rather than eval() keeps the caller's text for error messages
+            return engine._eval(node)
+        finally:
+            for key in bindings:
+                del names[key]
+            names.update(saved)
+
+    memo = None
+    if memo_size > 0 and not slots and not calls:
+        memo = LRUCache(memo_size)
+        plain = call
+
+        def call(*args):
+            try:
+                value = memo.get(args, memo)
+            except TypeError:
+                # Unhashable arguments (arrays) aren't remembered
+                return plain(*args)
+            if value is memo:
+                value = plain(*args)
+                memo.put(args, value)
+            return value
+
+    call.__name__ = name
+    return UserFunction(
+        name, params, body, call, node, tuple(var for var, _ in slots), calls, memo,
+    )
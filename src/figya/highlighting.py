@@ -1,35 +1,74 @@
 """Syntax highlighting via Pygments lexer + One Dark-inspired color theme."""
 
-from pygments.lexer import RegexLexer, bygroups
-from pygments.token import Token, Number, Name, Operator, Punctuation, Keyword, String
+from pygments.lexer import Lexer
+from pygments.token import Number, Name, Operator, Punctuation, Keyword, Text, Error
 
 from prompt_toolkit.styles import Style
 
+from figya.commands import COMMAND_NAMES
+from figya.evaluator import MATH_FUNCTIONS, MATH_CONSTANTS
+from figya.tokenizer import (
+    COMMA, CONVERSION_KEYWORDS, ERROR, LPAREN, NAME, NUMBER, OP, RPAREN, VARIABLE, WS, scan,
+    tokenize,
+)
+from figya.units import unit_index
 
-class FigyaLexer(RegexLexer):
+
+_TOKEN_TYPES = {
+    NUMBER: Number,
+    VARIABLE: Name.Variable,
+    OP: Operator,
+    LPAREN: Punctuation,
+    RPAREN: Punctuation,
+    COMMA: Punctuation,
+    WS: Text.Whitespace,
+    ERROR: Error,
+}
+
+# Words that are neither units nor anything else figya knows
+UNKNOWN_NAME = Name.Other
+
+
+def _name_type(word: str, units, known=()):
+    if word in COMMAND_NAMES or word in CONVERSION_KEYWORDS:
+        return Keyword
+    if word in MATH_FUNCTIONS:
+        return Name.Function
+    if word in MATH_CONSTANTS:
+        return Name.Constant
+    # Unit names; without an index (pint never loaded) every word might be one
+    if units is None or word in known or word in units:
+        return Name
+    return UNKNOWN_NAME
+
+
+class FigyaLexer(Lexer):
+    """Highlights from the same token stream the evaluator uses.
+
+    Words followed by ( are functions, built-in or user-defined. Other
+    words are checked against the shared unit index, and those that aren't
+    units are marked, except in command arguments (save my-work).
+    """
     name = "Figya"
-    tokens = {
-        "root": [
-            # Commands
-            (r'\b(help|list|save|restore|delete|clear|quit|exit)\b', Keyword),
-            # Unit conversion keywords
-            (r'\b(in|to)\b', Keyword),
-            # Numbers (including decimals and negative)
-            (r'-?\d+\.?\d*(?:e[+-]?\d+)?', Number),
-            # Variables
-            (r'\$[a-zA-Z_]\w*|\$\d+', Name.Variable),
-            # Functions
-            (r'\b(sin|cos|tan|asin|acos|atan|sqrt|log|log2|ln|exp|abs|round|floor|ceil|factorial|degrees|radians|gcd|lcm|min|max|hex|oct|bin)\b', Name.Function),
-            # Constants
-            (r'\b(pi|tau|e|inf)\b', Name.Constant),
-            # Operators
-            (r'[+\-*/^%=!]', Operator),
-            # Parentheses
-            (r'[()]', Punctuation),
-            # Unit names (catch-all for words)
-            (r'[a-zA-Z_]\w*', Name),
-        ],
-    }
+
+    def get_tokens_unprocessed(self, text):
+        tokens = tokenize(text)
+        units = unit_index()
+        known = ()
+        if units is not None:
+            first = next((tok for tok in tokens if tok.kind != WS), None)
+            if first is not None and first.text in COMMAND_NAMES:
+                units = None
+            else:
+                # A definition's parameters are names in its body
+                known = scan(text).params
+        for i, tok in enumerate(tokens):
+            if tok.kind != NAME:
+                yield tok.start, _TOKEN_TYPES[tok.kind], tok.text
+            elif i + 1 < len(tokens) and tokens[i + 1].kind == LPAREN:
+                yield tok.start, Name.Function, tok.text
+            else:
+                yield tok.start, _name_type(tok.text, units, known), tok.text
 
 
 # One Dark-inspired palette
@@ -46,6 +85,7 @@ FIGYA_STYLE = Style.from_dict({
     "pygments.operator": "#56b6c2",
     "pygments.punctuation": "#abb2bf",
     "pygments.name": "#98c379",
+    "pygments.name.other": "#e5c07b underline",
 
     # Toolbar
     "bottom-toolbar": "bg:#21252b #abb2bf",
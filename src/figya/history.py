@@ -0,0 +1,180 @@
+"""REPL history: bounded, read from the end of the file, indexed for auto-suggest."""
+
+import os
+from bisect import bisect_left, insort
+from pathlib import Path
+
+from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
+from prompt_toolkit.history import History
+
+
+# Entries kept in memory and in the history file after rotation
+HISTORY_MAX_ENTRIES = 10_000
+
+# Bytes read per step when scanning the history file backwards
+READ_BLOCK = 1 << 16
+
+
+def read_tail(path: Path, limit: int) -> tuple[list[str], bool]:
+    """The last `limit` entries of a history file, oldest first.
+
+    The file uses prompt_toolkit's FileHistory format: each entry is a run
+    of '+'-prefixed lines, separated by comment or blank lines. It is read
+    backwards a block at a time, so the cost depends on `limit` rather
+    than on the size of the file. The flag is True when older entries
+    were left unread.
+    """
+    entries: list[str] = []
+    current: list[str] = []
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], False
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b""
+        while pos > 0 and len(entries) < limit:
+            size = min(READ_BLOCK, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + rest).split(b"\n")
+            # Unless this is the start of the file the first line may be partial
+            rest = lines.pop(0) if pos else b""
+            for raw in reversed(lines):
+                line = raw.decode("utf-8", errors="replace")
+                if line.startswith("+"):
+                    current.append(line[1:])
+                elif current:
+                    entries.append("\n".join(reversed(current)))
+                    current = []
+                    if len(entries) >= limit:
+                        break
+        if current and len(entries) < limit:
+            entries.append("\n".join(reversed(current)))
+    entries.reverse()
+    return entries, pos > 0
+
+
+def _format_entry(string: str) -> str:
+    return "\n" + "".join(f"+{line}\n" for line in string.split("\n"))
+
+
+class PrefixIndex:
+    """Most recent line starting with a given prefix.
+
+    Distinct lines are kept sorted, each with the sequence number of its
+    latest use; a lookup bisects to the lines sharing the prefix and picks
+    the newest.
+    """
+
+    def __init__(self):
+        self._lines: list[str] = []
+        self._seq: dict[str, int] = {}
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def add(self, line: str):
+        if line not in self._seq:
+            insort(self._lines, line)
+        self._seq[line] = self._next
+        self._next += 1
+
+    def extend(self, lines):
+        fresh = False
+        for line in lines:
+            if line not in self._seq:
+                fresh = True
+            self._seq[line] = self._next
+            self._next += 1
+        if fresh:
+            self._lines = sorted(self._seq)
+
+    def newest(self, prefix: str) -> str | None:
+        lines, seq = self._lines, self._seq
+        best, best_seq = None, -1
+        i = bisect_left(lines, prefix)
+        while i < len(lines) and lines[i].startswith(prefix):
+            if seq[lines[i]] > best_seq:
+                best, best_seq = lines[i], seq[lines[i]]
+            i += 1
+        return best
+
+
+class BoundedHistory(History):
+    """prompt_toolkit History keeping only the latest entries.
+
+    Only the last `max_entries` entries are read at startup, however long
+    the file has grown. Once the file holds twice that many, the next write
+    rotates it: the old file becomes `<name>.1` and a fresh file starts
+    with the recent entries, so rewriting is amortized over `max_entries`
+    appends.
+    """
+
+    def __init__(self, path: Path, max_entries: int = HISTORY_MAX_ENTRIES):
+        super().__init__()
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.index = PrefixIndex()
+        self._entries: list[str] | None = None
+        # Entries in the file beyond the latest max_entries
+        self._overflow = 0
+
+    def _recent(self) -> list[str]:
+        if self._entries is None:
+            self._entries, truncated = read_tail(self.path, self.max_entries)
+            # A file that outgrew the cap is rotated on the first write
+            self._overflow = self.max_entries if truncated else 0
+            self.index.extend(
+                line for entry in self._entries for line in entry.splitlines()
+            )
+        return self._entries
+
+    def load_history_strings(self):
+        yield from reversed(self._recent())
+
+    def store_string(self, string: str):
+        entries = self._recent()
+        entries.append(string)
+        for line in string.splitlines():
+            self.index.add(line)
+        if len(entries) > self.max_entries:
+            del entries[: len(entries) - self.max_entries]
+            self._overflow += 1
+
+        if self._overflow >= self.max_entries:
+            self._rotate()
+            return
+        with open(self.path, "ab") as f:
+            f.write(_format_entry(string).encode("utf-8"))
+
+    def _rotate(self):
+        """Move the history file aside and start over with the recent entries."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write("".join(_format_entry(s) for s in self._entries).encode("utf-8"))
+        if self.path.exists():
+            os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+        os.replace(tmp, self.path)
+        self._overflow = 0
+
+    def suggest(self, text: str) -> str | None:
+        """Most recent history line starting with text."""
+        self._recent()
+        return self.index.newest(text)
+
+
+class HistoryAutoSuggest(AutoSuggest):
+    """Like AutoSuggestFromHistory, but looks lines up in the prefix index."""
+
+    def get_suggestion(self, buffer, document):
+        history = buffer.history
+        text = document.text.rsplit("\n", 1)[-1]
+        if not text.strip() or not isinstance(history, BoundedHistory):
+            return None
+        line = history.suggest(text)
+        if line is None or line == text:
+            return None
+        return Suggestion(line[len(text):])
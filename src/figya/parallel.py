@@ -0,0 +1,134 @@
+"""Parallel pipe mode: independent lines are evaluated across a process pool."""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from figya.budget import Budget
+from figya.commands import COMMAND_NAMES
+from figya.evaluator import Evaluator, Result
+from figya.pipe import Output, run_line
+from figya.tokenizer import NAME, scan, tokenize
+from figya.variables import VariableStore
+
+
+# Independent lines sent to a worker per task
+CHUNK_SIZE = 256
+
+# Chunks in flight per worker before the main process stops reading ahead
+READ_AHEAD = 4
+
+_worker_evaluator: Evaluator | None = None
+
+
+def _init_worker(exact: bool, limits: tuple[float, int] | None = None):
+    """Set up a worker's evaluator; limits is (timeout, memory MB) for its own Budget."""
+    global _worker_evaluator
+    _worker_evaluator = Evaluator(VariableStore(), exact=exact)
+    if limits is not None:
+        _worker_evaluator.budget = Budget(*limits)
+
+
+def _eval_chunk(exact: bool, lines: list[str]) -> list[tuple[bool, object, str, str]]:
+    """Evaluate independent lines in a worker, in the session's exact mode.
+
+    Returns (ok, value, display, unit) per line; on error display is the message.
+    """
+    if _worker_evaluator.exact != exact:
+        _worker_evaluator.exact = exact
+    results = []
+    for line in lines:
+        try:
+            value, display, unit = _worker_evaluator.compute(line)
+            results.append((True, value, display, unit))
+        except Exception as e:
+            results.append((False, None, str(e), ""))
+    return results
+
+
+def _is_command(line: str) -> bool:
+    return line.split(None, 1)[0].lower() in COMMAND_NAMES
+
+
+def is_independent(line: str, functions=()) -> bool:
+    """True if a line neither reads nor writes session state.
+
+    Definitions and calls to user-defined functions (names in functions)
+    need the session's functions, so they aren't independent.
+    """
+    if "$" in line or "=" in line:
+        return False
+    if _is_command(line):
+        return False
+    return not functions or not any(
+        tok.kind == NAME and tok.text in functions for tok in tokenize(line)
+    )
+
+
+def _emit_chunk(linenos: list[int], results, variables: VariableStore, output: Output):
+    for lineno, (ok, value, display, unit) in zip(linenos, results):
+        if ok:
+            name = variables.add_result(value)
+            output.result(lineno, Result(name, value, display, unit))
+        else:
+            output.error(lineno, display)
+
+
+def run_pipe_parallel(blocks, variables: VariableStore, evaluator: Evaluator, jobs: int,
+                      output: Output):
+    """Evaluate piped lines with the same output and $N numbering as a serial run.
+
+    Runs of independent lines are evaluated ahead in worker processes; lines
+    that reference variables or are commands run here once every earlier
+    result has been stored. A command is a barrier: it runs before any
+    later line is sent out, since it can change the mode or the functions.
+    """
+    # Functions defined so far, including by lines still waiting to run
+    functions = set(variables.functions())
+    budget = evaluator.budget
+    limits = (budget.timeout, budget.memory_mb) if budget is not None else None
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(evaluator.exact, limits),
+    ) as pool:
+        # (line number, line) to run here, or (line numbers, future) for a chunk
+        pending: deque = deque()
+        batch: list[tuple[int, str]] = []
+
+        def flush():
+            if batch:
+                linenos = [lineno for lineno, _ in batch]
+                future = pool.submit(_eval_chunk, evaluator.exact, [line for _, line in batch])
+                pending.append((linenos, future))
+                batch.clear()
+
+        def drain(limit: int):
+            while len(pending) > limit:
+                first, second = pending.popleft()
+                if isinstance(second, str):
+                    run_line(first, second, variables, evaluator, output)
+                else:
+                    _emit_chunk(first, second.result(), variables, output)
+
+        try:
+            for block in blocks:
+                for lineno, line in block:
+                    if is_independent(line, functions):
+                        batch.append((lineno, line))
+                        if len(batch) >= CHUNK_SIZE:
+                            flush()
+                    else:
+                        definition = scan(line)
+                        if definition.kind == "definition":
+                            functions.add(definition.target)
+                        flush()
+                        pending.append((lineno, line))
+                        if _is_command(line):
+                            # restore, clear and exact take effect before the next line
+                            drain(0)
+                            functions = set(variables.functions())
+                    drain(jobs * READ_AHEAD)
+                output.flush()
+
+            flush()
+            drain(0)
+        finally:
+            output.flush()
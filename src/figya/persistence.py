@@ -1,60 +1,206 @@
 """Auto-save, named workspaces, JSON persistence."""
 
+import base64
 import json
+import os
+from fractions import Fraction
 
-from figya.config import AUTOSAVE_FILE, WORKSPACES_DIR
+from figya import arrays
+
+from figya.config import (
+    AUTOSAVE_FILE, JOURNAL_FILE, WORKSPACE_BACKEND, WORKSPACES_DB, WORKSPACES_DIR,
+)
 from figya.variables import VariableStore
 
 
+# Minimum journal size at which autosave folds it into a new snapshot
+JOURNAL_COMPACT_BYTES = 1 << 20
+
+# Integers longer than this are saved in hex: JSON's decimal form is slow
+# for them, and Python refuses to print ints past 4300 digits
+HEX_INT_BITS = 4096
+
+
+def encode_value(value):
+    """A variable's value in JSON-ready form; exact values get a tagged dict."""
+    if type(value) is int and value.bit_length() > HEX_INT_BITS:
+        return {"int": hex(value)}
+    if isinstance(value, Fraction):
+        return {"fraction": [encode_value(value.numerator), encode_value(value.denominator)]}
+    if arrays.is_array(value):
+        # Raw float64s in base64, about a third the size of a JSON list
+        return {"array": base64.b64encode(arrays.to_bytes(value)).decode("ascii")}
+    return value
+
+
+def decode_object(obj: dict):
+    """json object_hook undoing encode_value."""
+    if len(obj) == 1:
+        if "int" in obj:
+            return int(obj["int"], 16)
+        if "fraction" in obj:
+            return Fraction(*obj["fraction"])
+        if "array" in obj:
+            return arrays.from_bytes(base64.b64decode(obj["array"]))
+    return obj
+
+
+def _encode_store(data: dict) -> dict:
+    return {**data, "vars": {name: encode_value(v) for name, v in data["vars"].items()}}
+
+
+def _encode_change(entry: list) -> list:
+    if entry[0] in ("set", "update"):
+        return [entry[0], entry[1], encode_value(entry[2]), *entry[3:]]
+    return entry
+
+
 def _ensure_dirs():
     AUTOSAVE_FILE.parent.mkdir(parents=True, exist_ok=True)
     WORKSPACES_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def autosave(variables: VariableStore):
-    """Write current state to autosave file."""
+    """Append changes since the last save to the journal.
+
+    The journal is folded into a fresh snapshot once it outgrows both
+    JOURNAL_COMPACT_BYTES and the snapshot, or when the whole store was
+    replaced.
+    """
+    changes, replaced = variables.take_changes()
+    if not changes and not replaced:
+        return
     _ensure_dirs()
-    data = variables.to_dict()
-    AUTOSAVE_FILE.write_text(json.dumps(data, indent=2))
+    if replaced:
+        _write_snapshot(variables)
+        return
+    # A lazily restored workspace is journaled as a "restore" entry, so
+    # saving right after `restore` doesn't load the whole workspace
+    with JOURNAL_FILE.open("a") as f:
+        f.write("".join(
+            json.dumps(_encode_change(entry), separators=(",", ":")) + "\n" for entry in changes
+        ))
+    # Compacting only once the journal outgrows the snapshot keeps the
+    # amortized cost per save constant however large the store gets.
+    snapshot_size = AUTOSAVE_FILE.stat().st_size if AUTOSAVE_FILE.exists() else 0
+    if JOURNAL_FILE.stat().st_size > max(JOURNAL_COMPACT_BYTES, snapshot_size):
+        _write_snapshot(variables)
+
+
+def _write_snapshot(variables: VariableStore):
+    """Atomically replace the autosave snapshot, then drop the journal."""
+    tmp = AUTOSAVE_FILE.with_name(AUTOSAVE_FILE.name + ".tmp")
+    with tmp.open("w") as f:
+        json.dump(_encode_store(variables.to_dict()), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, AUTOSAVE_FILE)
+    # Replaying a journal over a snapshot that already has it is harmless,
+    # so a crash between these two steps loses nothing.
+    JOURNAL_FILE.unlink(missing_ok=True)
 
 
 def autoload(variables: VariableStore):
-    """Load state from autosave file if it exists."""
+    """Load the autosave snapshot, then replay the journal on top of it."""
     if AUTOSAVE_FILE.exists():
         try:
-            data = json.loads(AUTOSAVE_FILE.read_text())
+            data = json.loads(AUTOSAVE_FILE.read_text(), object_hook=decode_object)
             variables.from_dict(data)
         except (json.JSONDecodeError, KeyError):
             pass
+    if JOURNAL_FILE.exists():
+        with JOURNAL_FILE.open() as f:
+            for line in f:
+                try:
+                    entry = json.loads(line, object_hook=decode_object)
+                    if entry[0] == "restore":
+                        _replay_restore(entry, variables)
+                    else:
+                        variables.apply_change(entry)
+                except (json.JSONDecodeError, ValueError, IndexError, TypeError):
+                    # A torn final write; everything before it is good
+                    break
+    variables.take_changes()
+
+
+def _replay_restore(entry: list, variables: VariableStore):
+    """Restore the workspace a journaled `restore` read from, lazily as before.
+
+    A workspace deleted since then leaves the store as it was.
+    """
+    _, backend, name = entry
+    if backend == "sqlite":
+        from figya.workspacedb import WorkspaceDB
+
+        WorkspaceDB(WORKSPACES_DB).restore(name, variables)
+
+
+def _workspace_db():
+    """The SQLite workspace store, or None when workspaces are JSON files."""
+    if WORKSPACE_BACKEND != "sqlite":
+        return None
+    from figya.workspacedb import WorkspaceDB
+
+    return WorkspaceDB(WORKSPACES_DB)
 
 
 def save_workspace(name: str, variables: VariableStore):
+    db = _workspace_db()
+    if db is not None:
+        variables.release(["sqlite", name])
+        db.save(name, variables)
+        return
     _ensure_dirs()
     path = WORKSPACES_DIR / f"{name}.json"
-    data = variables.to_dict()
+    data = _encode_store(variables.to_dict())
     path.write_text(json.dumps(data, indent=2))
 
 
 def restore_workspace(name: str, variables: VariableStore) -> bool:
+    db = _workspace_db()
+    if db is not None and db.restore(name, variables):
+        return True
+    # JSON workspaces saved before switching to SQLite stay restorable
     path = WORKSPACES_DIR / f"{name}.json"
     if not path.exists():
         return False
     try:
-        data = json.loads(path.read_text())
+        data = json.loads(path.read_text(), object_hook=decode_object)
         variables.from_dict(data)
         return True
     except (json.JSONDecodeError, KeyError):
         return False
 
 
-def delete_workspace(name: str) -> bool:
+def delete_workspace(name: str, variables: VariableStore | None = None) -> bool:
+    db = _workspace_db()
+    if db is not None and variables is not None:
+        variables.release(["sqlite", name])
+    deleted = db is not None and db.delete(name)
     path = WORKSPACES_DIR / f"{name}.json"
     if path.exists():
         path.unlink()
         return True
-    return False
+    return deleted
 
 
 def list_workspaces() -> list[str]:
+    return sorted({name for name, _, _ in find_workspaces()})
+
+
+def find_workspaces(pattern: str = "") -> list[tuple[str, int | None, float]]:
+    """(name, variable count, saved time) of workspaces whose name contains pattern.
+
+    The count is None for JSON workspaces, which would have to be parsed
+    to count.
+    """
     _ensure_dirs()
-    return sorted(p.stem for p in WORKSPACES_DIR.glob("*.json"))
+    found = {}
+    for p in WORKSPACES_DIR.glob("*.json"):
+        if pattern in p.stem:
+            found[p.stem] = (p.stem, None, p.stat().st_mtime)
+    db = _workspace_db()
+    if db is not None:
+        for row in db.search(pattern):
+            found[row[0]] = row
+    return sorted(found.values())
@@ -0,0 +1,175 @@
+"""Pipe mode: block reads, buffered writes, and structured output formats."""
+
+import csv
+import io
+import json
+import math
+import sys
+from fractions import Fraction
+
+from figya import arrays
+from figya.commands import handle_command
+from figya.evaluator import Evaluator, Result, format_number
+from figya.persistence import HEX_INT_BITS
+from figya.variables import VariableStore
+
+
+# Most bytes taken from stdin per read
+READ_BLOCK = 1 << 16
+
+# Buffered output is written out once it grows past this many characters
+WRITE_BLOCK = 1 << 16
+
+# Columns of csv and tsv output
+FIELDS = ("line", "name", "value", "unit", "error")
+
+
+def read_blocks(stream=None):
+    """Non-blank lines of a binary stream as lists of (line number, text).
+
+    Each read takes whatever input is available, up to READ_BLOCK bytes,
+    so a fast producer is read in large blocks while a slow one (tail -f)
+    still has each line handled as soon as it arrives.
+    """
+    if stream is None:
+        stream = sys.stdin.buffer
+    lineno = 0
+    rest = b""
+    while True:
+        data = stream.read1(READ_BLOCK)
+        if not data:
+            break
+        lines = (rest + data).split(b"\n")
+        rest = lines.pop()
+        block = []
+        for raw in lines:
+            lineno += 1
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                block.append((lineno, line))
+        if block:
+            yield block
+    line = rest.decode("utf-8", errors="replace").strip()
+    if line:
+        yield [(lineno + 1, line)]
+
+
+def record_value(value):
+    """A value as JSON data: numbers stay numbers wherever JSON can hold them."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else format_number(value)
+    if isinstance(value, int):
+        # JSON has no limit, but most readers (and Python's str()) do
+        return value if value.bit_length() <= HEX_INT_BITS else format_number(value)
+    if isinstance(value, Fraction):
+        if max(value.numerator.bit_length(), value.denominator.bit_length()) <= HEX_INT_BITS:
+            return f"{value.numerator}/{value.denominator}"
+        return format_number(value)
+    if arrays.is_array(value):
+        return [record_value(v) for v in value.tolist()]
+    return value
+
+
+def _field(value) -> str:
+    value = record_value(value)
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, float):
+        return repr(value)
+    return "" if value is None else str(value)
+
+
+class Output:
+    """Pipe-mode output, buffered and written a block at a time.
+
+    In the default text format results go to stdout as `$N = value` and
+    errors to stderr, as before; jsonl, csv and tsv give one record per
+    input line, errors included, with the value in machine-readable form.
+    """
+
+    def __init__(self, fmt: str = "text", out=None, err=None):
+        self.format = fmt
+        self.out = out if out is not None else sys.stdout
+        self.err = err if err is not None else sys.stderr
+        self._buffer = io.StringIO()
+        self._csv = None
+        if fmt in ("csv", "tsv"):
+            self._csv = csv.writer(
+                self._buffer, delimiter="," if fmt == "csv" else "\t", lineterminator="\n",
+            )
+            self._csv.writerow(FIELDS)
+
+    def _record(self, record: dict):
+        if self._csv is not None:
+            self._csv.writerow(record.get(field, "") for field in FIELDS)
+        else:
+            self._buffer.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self._buffer.tell() > WRITE_BLOCK:
+            self.flush()
+
+    def result(self, lineno: int, result: Result):
+        """A result, followed by any variables recomputed because of it."""
+        if self.format == "text":
+            self._buffer.write(f"{result.name} = {result.display}\n")
+            for updated in result.updated:
+                self._buffer.write(f"{updated.name} = {updated.display}\n")
+            if result.errors:
+                for name, message in result.errors:
+                    self.error(lineno, f"{name}: {message}")
+            elif self._buffer.tell() > WRITE_BLOCK:
+                self.flush()
+            return
+        for r in (result, *result.updated):
+            value = _field(r.value) if self._csv is not None else record_value(r.value)
+            self._record({"line": lineno, "name": r.name, "value": value, "unit": r.unit or None})
+        for name, message in result.errors:
+            self._record({"line": lineno, "name": name, "error": message})
+
+    def command(self, lineno: int, name: str, text: str):
+        """Output of a command line such as `list` or `save`."""
+        if self.format == "text":
+            self._buffer.write(text.strip() + "\n")
+            return
+        self._record({"line": lineno, "name": name, "value": text.strip()})
+
+    def error(self, lineno: int, message: str):
+        if self.format == "text":
+            # Keep errors in order with the results around them
+            self.flush()
+            print(f"error: {message}", file=self.err)
+            return
+        self._record({"line": lineno, "error": message})
+
+    def flush(self):
+        if self._buffer.tell():
+            self.out.write(self._buffer.getvalue())
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        self.out.flush()
+
+
+def run_line(lineno: int, line: str, variables: VariableStore, evaluator: Evaluator,
+             output: Output):
+    """Run one piped line: a command, or an expression to evaluate and store."""
+    cmd_result = handle_command(line, variables, evaluator)
+    if cmd_result is not None:
+        output.command(lineno, line.split(None, 1)[0].lower(), cmd_result)
+        return
+    try:
+        result = evaluator.evaluate_result(line)
+    except Exception as e:
+        output.error(lineno, str(e))
+        return
+    if result is not None:
+        output.result(lineno, result)
+
+
+def run_pipe(blocks, variables: VariableStore, evaluator: Evaluator, output: Output):
+    """Evaluate piped lines in order, writing output after each block read."""
+    try:
+        for block in blocks:
+            for lineno, line in block:
+                run_line(lineno, line, variables, evaluator, output)
+            output.flush()
+    finally:
+        output.flush()
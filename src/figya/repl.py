@@ -2,8 +2,6 @@
 
 from prompt_toolkit import PromptSession
 from prompt_toolkit.formatted_text import HTML
-from prompt_toolkit.history import FileHistory
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
 from prompt_toolkit.lexers import PygmentsLexer
 
 from figya.config import HISTORY_FILE, DATA_DIR
@@ -12,13 +10,24 @@ from figya.evaluator import Evaluator, format_number
 from figya.commands import handle_command
 from figya.persistence import autosave, autoload
 from figya.completions import FigyaCompleter
+from figya.history import BoundedHistory, HistoryAutoSuggest
 from figya.highlighting import FigyaLexer, FIGYA_STYLE
+from figya.timing import StageTimer
 
 
-def run_repl():
+def run_repl(profile: bool = False, exact: bool = False, budget=None, reactive: bool = False):
     """Start the interactive REPL."""
     variables = VariableStore()
-    evaluator = Evaluator(variables)
+    evaluator = Evaluator(variables, exact=exact, reactive=reactive)
+    if profile:
+        evaluator.timer = StageTimer()
+    evaluator.budget = budget
+
+    # Warm up pint while the prompt is already showing
+    evaluator.preload()
+    # and start the worker for long-running expressions
+    if budget is not None:
+        budget.start()
 
     # Load previous session
     autoload(variables)
@@ -37,8 +46,8 @@ def run_repl():
         )
 
     session: PromptSession = PromptSession(
-        history=FileHistory(str(HISTORY_FILE)),
-        auto_suggest=AutoSuggestFromHistory(),
+        history=BoundedHistory(HISTORY_FILE),
+        auto_suggest=HistoryAutoSuggest(),
         completer=FigyaCompleter(variables),
         lexer=PygmentsLexer(FigyaLexer),
         style=FIGYA_STYLE,
@@ -59,7 +68,7 @@ def run_repl():
             continue
 
         # Try commands first
-        cmd_result = handle_command(line, variables)
+        cmd_result = handle_command(line, variables, evaluator)
         if cmd_result is not None:
             print(cmd_result)
             autosave(variables)
@@ -73,5 +82,7 @@ def run_repl():
                 autosave(variables)
         except ValueError as e:
             print(f"  error: {e}")
+        except KeyboardInterrupt:
+            print("  cancelled")
         except Exception as e:
             print(f"  error: {e}")
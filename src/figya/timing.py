@@ -0,0 +1,77 @@
+"""Per-stage timing of evaluations, for `--profile` and the `timing` command."""
+
+import time
+from collections import deque
+
+
+# Evaluations kept for the `timing` command
+HISTORY_SIZE = 50
+
+
+class StageTimer:
+    """Records how long each stage of an evaluation took.
+
+    The evaluator calls start(), then mark(stage) at the end of each stage,
+    then finish(). Each mark charges the time since the previous one to
+    that stage. The evaluator only calls these when a timer is attached,
+    so profiling costs nothing when it is off.
+    """
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self.recent: deque = deque(maxlen=size)
+        self.totals: dict[str, float] = {}
+        self.count = 0
+        self._expr = ""
+        self._stages: dict[str, float] = {}
+        self._start = 0.0
+        self._last = 0.0
+
+    def start(self, expr: str):
+        self._expr = expr
+        self._stages = {}
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self._stages[stage] = self._stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def finish(self, ok: bool = True):
+        total = time.perf_counter() - self._start
+        self.recent.append((self._expr, self._stages, total, ok))
+        for stage, seconds in self._stages.items():
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        self.totals["total"] = self.totals.get("total", 0.0) + total
+        self.count += 1
+
+    def clear(self):
+        self.recent.clear()
+        self.totals.clear()
+        self.count = 0
+
+    def report(self) -> str:
+        """Recent evaluations with their per-stage times, newest last."""
+        if not self.recent:
+            return "  no timings yet"
+        lines = []
+        for expr, stages, total, ok in self.recent:
+            parts = "  ".join(f"{stage} {seconds * 1e3:.3f}" for stage, seconds in stages.items())
+            flag = "" if ok else "  (error)"
+            lines.append(f"  {total * 1e3:8.3f} ms  {expr}{flag}\n             {parts}")
+        return "\n".join(lines)
+
+    def summary(self) -> str:
+        """Totals per stage across every evaluation so far."""
+        if not self.count:
+            return "  no timings"
+        total = self.totals.get("total", 0.0)
+        lines = [f"  {self.count} evaluations, {total * 1e3:.1f} ms"]
+        stages = sorted(
+            ((s, t) for s, t in self.totals.items() if s != "total"),
+            key=lambda item: item[1], reverse=True,
+        )
+        for stage, seconds in stages:
+            share = seconds / total * 100 if total else 0.0
+            mean_us = seconds / self.count * 1e6
+            lines.append(f"  {stage:<16} {seconds * 1e3:10.1f} ms  {share:5.1f}%  {mean_us:9.1f} us/line")
+        return "\n".join(lines)
@@ -0,0 +1,284 @@
+"""Single-pass tokenizer shared by the evaluator, highlighter and completer."""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+
+# Token kinds
+NUMBER = "number"
+VARIABLE = "variable"
+NAME = "name"
+OP = "op"
+LPAREN = "lparen"
+RPAREN = "rparen"
+COMMA = "comma"
+WS = "ws"
+ERROR = "error"
+
+# Words that split "<quantity> in|to <unit>"
+CONVERSION_KEYWORDS = ("in", "to")
+
+# a..b, an inclusive range; to_python turns it into span(a, b)
+RANGE_OP = ".."
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<number>0[xX](?:_?[0-9a-fA-F])+|0[oO](?:_?[0-7])+|0[bB](?:_?[01])+
+              |(?:\d(?:_?\d)*(?:\.(?!\.)(?:\d(?:_?\d)*)?)?|\.\d(?:_?\d)*)(?:[eE][+-]?\d(?:_?\d)*)?)
+  | (?P<variable>\$(?:[a-zA-Z_]\w*|\d+)?)
+  | (?P<name>[a-zA-Z_]\w*)
+  | (?P<op>\.\.|\*\*|//|==|!=|<=|>=|<<|>>|[-+*/%^=!<>&|~.])
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<comma>,)
+  | (?P<error>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+
+class Scan(NamedTuple):
+    """A classified line.
+
+    tokens/text are the part to evaluate as math: the value of an
+    assignment, otherwise the whole line (a conversion that pint rejects
+    falls back to math).
+    """
+    kind: str                         # "assignment", "definition", "conversion" or "math"
+    line: str
+    tokens: tuple[Token, ...]
+    text: str
+    target: str | None = None         # assignment: the $name assigned to; definition: the function
+    params: tuple[str, ...] = ()      # definition: parameter names
+    from_tokens: tuple[Token, ...] = ()  # conversion: left of in/to
+    to_text: str = ""                 # conversion: right of in/to
+
+    @property
+    def from_text(self) -> str:
+        if not self.from_tokens:
+            return ""
+        return self.line[self.from_tokens[0].start:self.from_tokens[-1].end]
+
+
+@lru_cache(maxsize=2048)
+def tokenize(line: str) -> tuple[Token, ...]:
+    """Split a line into tokens in one linear scan. Whitespace is kept."""
+    return tuple(Token(m.lastgroup, m.group(), m.start()) for m in _TOKEN_RE.finditer(line))
+
+
+def _strip_ws(tokens) -> tuple[Token, ...]:
+    start, end = 0, len(tokens)
+    while start < end and tokens[start].kind == WS:
+        start += 1
+    while end > start and tokens[end - 1].kind == WS:
+        end -= 1
+    return tuple(tokens[start:end])
+
+
+@lru_cache(maxsize=2048)
+def scan(line: str) -> Scan:
+    """Tokenize a line and classify it as assignment, conversion or math."""
+    tokens = tokenize(line)
+    significant = [i for i, tok in enumerate(tokens) if tok.kind != WS]
+
+    # $name = expr
+    if len(significant) >= 3:
+        first, second = tokens[significant[0]], tokens[significant[1]]
+        if (first.kind == VARIABLE and len(first.text) > 1 and not first.text[1].isdigit()
+                and second.kind == OP and second.text == "="):
+            value = _strip_ws(tokens[significant[1] + 1:])
+            return Scan(
+                "assignment", line, value, line[value[0].start:value[-1].end],
+                target=first.text,
+            )
+
+    # name(x, y) = expr
+    definition = _definition(tokens, significant)
+    if definition is not None:
+        name, params, value = definition
+        return Scan(
+            "definition", line, value, line[value[0].start:value[-1].end],
+            target=name, params=params,
+        )
+
+    # <expr> in|to <unit>, split at the first keyword with whitespace around it
+    for i in range(1, len(tokens) - 1):
+        tok = tokens[i]
+        if (tok.kind == NAME and tok.text.lower() in CONVERSION_KEYWORDS
+                and tokens[i - 1].kind == WS and tokens[i + 1].kind == WS):
+            from_tokens = _strip_ws(tokens[:i])
+            to_text = line[tok.end:].strip()
+            if from_tokens and to_text:
+                stripped = _strip_ws(tokens)
+                return Scan(
+                    "conversion", line, stripped, line.strip(),
+                    from_tokens=from_tokens, to_text=to_text,
+                )
+
+    return Scan("math", line, _strip_ws(tokens), line.strip())
+
+
+def _definition(tokens, significant):
+    """(name, params, value tokens) for a line like f(x, y) = expr, else None."""
+    if len(significant) < 5:
+        return None
+    sig = [tokens[i] for i in significant]
+    if sig[0].kind != NAME or sig[1].kind != LPAREN:
+        return None
+    params = []
+    j = 2
+    if sig[j].kind != RPAREN:
+        while j + 1 < len(sig) and sig[j].kind == NAME and sig[j + 1].kind in (COMMA, RPAREN):
+            params.append(sig[j].text)
+            j += 2
+            if sig[j - 1].kind == RPAREN:
+                break
+        else:
+            return None
+        j -= 1
+    if j + 2 >= len(sig) or sig[j + 1].kind != OP or sig[j + 1].text != "=":
+        return None
+    return sig[0].text, tuple(params), _strip_ws(tokens[significant[j + 2]:])
+
+
+def number_value(text: str) -> float:
+    """Value of a NUMBER token; hex, octal and binary literals included."""
+    try:
+        return float(text)
+    except ValueError:
+        return float(int(text, 0))
+
+
+def split_amount(line: Scan) -> tuple[float, str] | None:
+    """Split a conversion's left side into (number, unit), e.g. '-5 feet'.
+
+    Returns None when it doesn't start with a plain number.
+    """
+    tokens = line.from_tokens
+    sign = 1.0
+    if len(tokens) >= 2 and tokens[0].kind == OP and tokens[0].text == "-" \
+            and tokens[1].kind == NUMBER and tokens[1].start == tokens[0].end:
+        sign = -1.0
+        tokens = tokens[1:]
+    if len(tokens) < 2 or tokens[0].kind != NUMBER:
+        return None
+    unit = line.line[tokens[0].end:tokens[-1].end].strip()
+    return (sign * number_value(tokens[0].text), unit)
+
+
+def slot_name(index: int) -> str:
+    """Placeholder identifier for the index-th variable in an expression.
+
+    Letters only, so it can never be read as part of a number.
+    """
+    letters = ""
+    while True:
+        index, rem = divmod(index, 26)
+        letters = chr(ord("a") + rem) + letters
+        if index == 0:
+            return f"var_{letters}"
+
+
+def _operand_end(tokens, i: int, step: int) -> int | None:
+    """Index of the last token of a range operand, walking from i by step.
+
+    The operand runs to the enclosing bracket or comma, so a..b binds more
+    loosely than any operator. None when the operand is empty.
+    """
+    opener, closer = (LPAREN, RPAREN) if step < 0 else (RPAREN, LPAREN)
+    depth = 0
+    end = None
+    j = i + step
+    while 0 <= j < len(tokens):
+        kind = tokens[j].kind
+        if kind == closer:
+            depth += 1
+        elif kind == opener:
+            if depth == 0:
+                break
+            depth -= 1
+        elif kind == COMMA and depth == 0:
+            break
+        if kind != WS:
+            end = j
+        j += step
+    return end
+
+
+def _ranges(tokens) -> tuple[dict[int, int], dict[int, int]]:
+    """Where each a..b starts and ends: counts of 'span(' and ')' per index."""
+    opens: dict[int, int] = {}
+    closes: dict[int, int] = {}
+    for i, tok in enumerate(tokens):
+        if tok.kind == OP and tok.text == RANGE_OP:
+            start, end = _operand_end(tokens, i, -1), _operand_end(tokens, i, 1)
+            if start is not None and end is not None:
+                opens[start] = opens.get(start, 0) + 1
+                closes[end] = closes.get(end, 0) + 1
+    return opens, closes
+
+
+@lru_cache(maxsize=2048)
+def to_python(tokens: tuple[Token, ...]) -> tuple[str, tuple[tuple[str, str], ...]]:
+    """Python source for math tokens, plus (variable, placeholder) pairs.
+
+    Each distinct $variable becomes a placeholder name, in order of first
+    appearance, so the source depends only on the shape of the line. In
+    the same pass, 5!, $n! and n! become factorial(...), a number or ')'
+    directly followed by a name, variable or '(' and a variable followed by
+    another get an explicit '*', and a..b becomes span(a, b).
+    """
+    out: list[str] = []
+    slots: dict[str, str] = {}
+    prev = None
+    skip_bang = False
+    opens, closes = _ranges(tokens) if any(t.text == RANGE_OP for t in tokens) else ({}, {})
+    for i, tok in enumerate(tokens):
+        kind = tok.kind
+        if skip_bang:
+            skip_bang = False
+            # factorial(...) closes like a parenthesis
+            prev = RPAREN
+            if i in closes:
+                out.append(")" * closes[i])
+            continue
+
+        if prev in (NUMBER, RPAREN) and kind in (NAME, VARIABLE):
+            out.append("*")
+        elif prev == VARIABLE and kind == VARIABLE:
+            # $a$b; spliced together the placeholders would make one name
+            out.append("*")
+        elif prev == RPAREN and kind == LPAREN:
+            out.append("*")
+
+        if i in opens:
+            out.append("span(" * opens[i])
+
+        text = tok.text
+        if kind == OP and text == RANGE_OP and closes:
+            text = ","
+        elif kind == VARIABLE:
+            text = slots.get(tok.text)
+            if text is None:
+                text = slots[tok.text] = slot_name(len(slots))
+
+        if kind in (NUMBER, VARIABLE, NAME) and i + 1 < len(tokens):
+            nxt = tokens[i + 1]
+            if nxt.kind == OP and nxt.text == "!":
+                text = f"factorial({text})"
+                skip_bang = True
+
+        out.append(text)
+        if i in closes and not skip_bang:
+            out.append(")" * closes[i])
+        prev = kind
+    return "".join(out), tuple(slots.items())
@@ -0,0 +1,189 @@
+"""Unit-name index: every spelling of a unit, resolved to pint's canonical name.
+
+The index is built from the pint registry the first time it loads and is
+saved next to its cache. From then on, routing a line, completing a word
+and highlighting an unknown unit are dictionary lookups that never load
+pint. A line like `$total in budget` is recognised as math without a
+registry load and a failed parse.
+"""
+
+from pathlib import Path
+
+from figya.cache import LRUCache
+from figya.config import PINT_CACHE_DIR
+from figya.tokenizer import LPAREN, NAME, VARIABLE, tokenize
+
+
+# The index of the last registry built, with the pint version it came from
+UNIT_INDEX_FILE = PINT_CACHE_DIR / "unit-index.json"
+
+# Friendly aliases for temperature. They match in any case and win over
+# pint's own reading of the word: to pint, c is the speed of light.
+TEMP_ALIASES = {
+    "fahrenheit": "degF", "farenheit": "degF", "f": "degF",
+    "celsius": "degC", "centigrade": "degC", "c": "degC",
+    "kelvin": "K",
+}
+
+# Number of prefixed or oddly cased spellings (km, Celsius) remembered once resolved
+RESOLVED_CACHE_SIZE = 4096
+
+
+class UnitIndex:
+    """Spellings of units mapped to their canonical names.
+
+    Names, symbols and aliases defined in the registry, and their plurals
+    as pint reads them, are one lookup away. Prefixed spellings such as
+    km or megawatts are resolved with pint's prefix rule the first time
+    they're seen and remembered, hits and misses alike.
+    """
+
+    def __init__(self, version: str, units: dict, plurals: dict, prefixes: dict):
+        self.version = version
+        # Registry spellings, the words worth offering as completions
+        self.names = tuple(units)
+        self._prefixes = prefixes
+        self._aliases = {
+            alias: units.get(symbol, symbol) for alias, symbol in TEMP_ALIASES.items()
+        }
+        spellings = {**plurals, **units}
+        for spelling in spellings:
+            alias = self._aliases.get(spelling.lower())
+            if alias is not None:
+                spellings[spelling] = alias
+        spellings.update(self._aliases)
+        self._units = spellings
+        self._resolved = LRUCache(RESOLVED_CACHE_SIZE)
+
+    @classmethod
+    def from_registry(cls, ureg, version: str) -> "UnitIndex":
+        """Index a registry. Plurals are checked with pint, once per pint version."""
+        units = {name: definition.name for name, definition in ureg._units.items()}
+        plurals = {}
+        for suffix in ureg._suffixes:
+            if not suffix:
+                continue
+            for name in units:
+                plural = name + suffix
+                if plural in units or plural in plurals:
+                    continue
+                candidates = ureg.parse_unit_name(plural)
+                # Only plain plurals: pint reads "ms" as milli-second, not meters
+                if candidates and not candidates[0][0]:
+                    plurals[plural] = candidates[0][1]
+        prefixes = {prefix: definition.name for prefix, definition in ureg._prefixes.items()
+                    if prefix}
+        return cls(version, units, plurals, prefixes)
+
+    @classmethod
+    def load(cls, path: Path = UNIT_INDEX_FILE) -> "UnitIndex | None":
+        """The saved index, or None if no registry has been built yet."""
+        # Imported here: only conversion-shaped lines and the REPL read this file
+        import json
+        try:
+            data = json.loads(path.read_text())
+            return cls(data["pint"], data["units"], data["plurals"], data["prefixes"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, path: Path = UNIT_INDEX_FILE):
+        import json
+        units = set(self.names)
+        data = {
+            "pint": self.version,
+            "units": {name: self._units[name] for name in self.names},
+            "plurals": {
+                spelling: canonical for spelling, canonical in self._units.items()
+                if spelling not in units and spelling not in self._aliases
+            },
+            "prefixes": self._prefixes,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data))
+        tmp.replace(path)
+
+    def resolve(self, word: str) -> str | None:
+        """The canonical name of a unit spelling, or None if it isn't one."""
+        canonical = self._units.get(word)
+        if canonical is not None:
+            return canonical
+        canonical = self._resolved.get(word)
+        if canonical is None:
+            canonical = self._resolve_prefixed(word)
+            self._resolved.put(word, canonical)
+        return canonical or None
+
+    def __contains__(self, word: str) -> bool:
+        return self.resolve(word) is not None
+
+    def _resolve_prefixed(self, word: str) -> str:
+        alias = self._aliases.get(word.lower())
+        if alias is not None:
+            return alias
+        units = self._units
+        for prefix, name in self._prefixes.items():
+            if word.startswith(prefix) and len(word) > len(prefix):
+                unit = units.get(word[len(prefix):])
+                if unit is not None:
+                    return name + unit
+        return ""
+
+
+_index = None   # None until first asked for, False while no index is saved
+
+
+def unit_index() -> UnitIndex | None:
+    """The shared index, read from disk on first use; None before pint has ever loaded."""
+    global _index
+    if _index is None:
+        _index = UnitIndex.load() or False
+    return _index or None
+
+
+def index_registry(ureg, version: str) -> UnitIndex:
+    """Make the index of a freshly built registry the shared one.
+
+    The saved index is reused if it came from the same pint version;
+    otherwise the registry is indexed and the result saved.
+    """
+    global _index
+    index = unit_index()
+    if index is None or index.version != version:
+        index = UnitIndex.from_registry(ureg, version)
+        try:
+            index.save()
+        except OSError:
+            pass
+    _index = index
+    return index
+
+
+def canonical_unit(text: str) -> str:
+    """The canonical name of a one-word unit; anything else as pint should see it."""
+    index = unit_index()
+    if index is None:
+        return TEMP_ALIASES.get(text.lower(), text)
+    return index.resolve(text) or text
+
+
+def _units_only(text: str, units: UnitIndex) -> bool:
+    """True if text names at least one unit and every name in it is one."""
+    tokens = tokenize(text)
+    found = False
+    for i, tok in enumerate(tokens):
+        if tok.kind == VARIABLE:
+            # pint doesn't know $variables; these lines are math
+            return False
+        if tok.kind != NAME:
+            continue
+        # name( is a function call, which pint can't evaluate
+        if tok.text not in units or (i + 1 < len(tokens) and tokens[i + 1].kind == LPAREN):
+            return False
+        found = True
+    return found
+
+
+def is_conversion(line, units: UnitIndex) -> bool:
+    """True if a line scanned as a conversion reads as units on both sides."""
+    return _units_only(line.from_text, units) and _units_only(line.to_text, units)
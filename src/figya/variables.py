@@ -1,92 +1,492 @@
 """Variable store, substitution, auto-naming."""
 
-import re
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, insort
+
+
+def _native(value):
+    """Stored hex/oct/bin results are strings; bind them as ints."""
+    if isinstance(value, str):
+        try:
+            return int(value, 0)
+        except ValueError:
+            return value
+    return value
+
+
+def result_number(name: str) -> int | None:
+    """N for an auto-numbered name like $12, else None."""
+    digits = name[1:]
+    if digits.isascii() and digits.isdigit() and digits[0] != "0":
+        return int(digits)
+    return None
+
+
+def _numbers_with_prefix(digits: str, upto: int):
+    """Numbers 1..upto whose decimal form starts with digits, ascending."""
+    if not digits:
+        yield from range(1, upto + 1)
+        return
+    if digits[0] == "0":
+        return
+    low = int(digits)
+    width = 1
+    while low <= upto:
+        yield from range(low, min(low + width, upto + 1))
+        low *= 10
+        width *= 10
 
 
 class VariableStore:
+    """Named variables plus the auto-numbered results $1..$N.
+
+    Results live in a flat array indexed by N - 1, with a liveness flag per
+    slot, so a session with a million results costs a few bytes each and
+    listing a range of them only touches that range. Values that aren't
+    plain floats (hex strings, exact integers) are kept in a side table.
+
+    User-defined functions are kept here too, as (params, body) source, so
+    they are saved and restored with the variables.
+
+    A named variable can also keep the expression it was assigned from (its
+    formula) and the named variables that expression reads. Those edges
+    form a DAG that says which formulas to recompute when a variable
+    changes, and in what order.
+    """
+
     def __init__(self):
-        self._vars: dict[str, float] = {}
+        self._named: dict[str, object] = {}
+        self._results = array("d")
+        self._live = bytearray()
+        self._boxed: dict[int, object] = {}
+        self._live_count = 0
         self._counter = 0
         self._last: float | None = None
+        # Journal entries recorded since the last take_changes()
+        self._changes: list[list] = []
+        self._replaced = False
+        # Workspaces journaled as "restore" entries since the last snapshot
+        self._restored: set[tuple] = set()
+        # Sorted named variables for prefix lookups and listing; None means
+        # stale, rebuilt on the next lookup
+        self._names: list[str] | None = []
+        # (load, count) while the contents are still to be fetched
+        self._lazy = None
+        # name -> (params, body); the version changes whenever they do
+        self._functions: dict[str, tuple[tuple[str, ...], str]] = {}
+        self._functions_version = 0
+        # name -> (expression, named variables it reads), and the reverse edges
+        self._formulas: dict[str, tuple[str, tuple[str, ...]]] = {}
+        self._dependents: dict[str, set[str]] = {}
 
     @property
     def count(self) -> int:
-        return len(self._vars)
+        """Number of variables, counting $_ like any other."""
+        if self._lazy is not None:
+            return self._lazy[1]
+        return len(self._named) + self._live_count + (self._last is not None)
+
+    @property
+    def counter(self) -> int:
+        """N of the most recent auto-numbered result."""
+        return self._counter
 
     @property
     def last(self) -> float | None:
         return self._last
 
+    @property
+    def functions_version(self) -> int:
+        """Changes whenever a function is defined, deleted or replaced."""
+        return self._functions_version
+
+    def functions(self) -> dict[str, tuple[tuple[str, ...], str]]:
+        """User-defined functions as name -> (params, body). Don't modify."""
+        return self._functions
+
+    def _define(self, name: str, params, body: str):
+        self._functions[name] = (tuple(params), body)
+        self._functions_version += 1
+
+    def define(self, name: str, params: tuple[str, ...], body: str):
+        """Define or replace the function name(params) = body."""
+        if self._lazy is not None:
+            self._load()
+        self._define(name, params, body)
+        self._changes.append(["define", name, list(params), body])
+
+    def undefine(self, name: str) -> bool:
+        if self._lazy is not None:
+            self._load()
+        if self._functions.pop(name, None) is None:
+            return False
+        self._functions_version += 1
+        self._changes.append(["undefine", name])
+        return True
+
+    def _store(self, name: str, value):
+        """Bind name to value, in the result array or the named table."""
+        if name == "$_":
+            # $_ is always the last value, which the caller tracks
+            return
+        n = result_number(name)
+        if n is None:
+            if name not in self._named and self._names is not None:
+                insort(self._names, name)
+            self._named[name] = value
+            return
+        i = n - 1
+        if i >= len(self._live):
+            grow = i + 1 - len(self._live)
+            self._results.extend([0.0] * grow)
+            self._live.extend(bytes(grow))
+        if not self._live[i]:
+            self._live[i] = 1
+            self._live_count += 1
+        if type(value) is float:
+            self._results[i] = value
+            self._boxed.pop(i, None)
+        else:
+            self._boxed[i] = value
+
+    def _result(self, i: int):
+        if i in self._boxed:
+            return self._boxed[i]
+        return self._results[i]
+
     def add_result(self, value: float) -> str:
         """Store a result with an auto-generated name. Returns the name."""
+        if self._lazy is not None:
+            self._load()
         self._counter += 1
         name = f"${self._counter}"
-        self._vars[name] = value
+        self._store(name, value)
         self._last = value
-        self._vars["$_"] = value
+        self._changes.append(["set", name, value, self._counter])
         return name
 
-    def set(self, name: str, value: float):
-        """Set a named variable."""
+    def set(self, name: str, value: float, formula: str | None = None,
+            refs: tuple[str, ...] = ()):
+        """Set a named variable, keeping formula (reading refs) if given.
+
+        Without a formula any previous one is dropped. Raises ValueError,
+        storing nothing, if the formula would make a cycle.
+        """
+        if self._lazy is not None:
+            self._load()
         if not name.startswith("$"):
             name = f"${name}"
-        self._vars[name] = value
+        if refs:
+            self._check_cycle(name, refs)
+        self._store(name, value)
         self._last = value
-        self._vars["$_"] = value
+        self._changes.append(["set", name, value, self._counter])
+        if formula is not None:
+            self._set_formula(name, formula, tuple(refs))
+            self._changes.append(["formula", name, formula, list(refs)])
+        elif name in self._formulas:
+            self._drop_formula(name)
+            self._changes.append(["formula", name, None, []])
+
+    def update(self, name: str, value):
+        """Store a recomputed value, keeping the formula and $_ as they are."""
+        self._store(name, value)
+        self._changes.append(["update", name, value])
+
+    def formula(self, name: str) -> tuple[str, tuple[str, ...]] | None:
+        """(expression, named variables it reads) that name was assigned from, if kept."""
+        if self._lazy is not None:
+            self._load()
+        return self._formulas.get(name)
+
+    def has_dependents(self, name: str) -> bool:
+        if self._lazy is not None:
+            self._load()
+        return bool(self._dependents.get(name))
+
+    def _set_formula(self, name: str, formula: str, refs: tuple[str, ...]):
+        self._drop_formula(name)
+        self._formulas[name] = (formula, refs)
+        for ref in refs:
+            self._dependents.setdefault(ref, set()).add(name)
+
+    def _drop_formula(self, name: str):
+        old = self._formulas.pop(name, None)
+        if old is None:
+            return
+        for ref in old[1]:
+            dependents = self._dependents.get(ref)
+            if dependents is not None:
+                dependents.discard(name)
+                if not dependents:
+                    del self._dependents[ref]
+
+    def _check_cycle(self, name: str, refs):
+        downstream = set(self.downstream(name))
+        for ref in refs:
+            if ref == name or ref in downstream:
+                raise ValueError(f"circular reference: {ref} depends on {name}")
+
+    def downstream(self, name: str) -> list[str]:
+        """Variables whose formulas read name, directly or through others.
+
+        They come in topological order, each after every variable it reads,
+        so recomputing them in turn sees up-to-date inputs. Only the part of
+        the graph below name is visited.
+        """
+        order = []
+        seen = {name}
+        dependents = self._dependents
+        stack = [(name, iter(sorted(dependents.get(name, ()))))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child not in seen:
+                    seen.add(child)
+                    stack.append((child, iter(sorted(dependents.get(child, ())))))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+        # Reverse postorder, without name itself
+        order.pop()
+        order.reverse()
+        return order
 
     def get(self, name: str) -> float | None:
-        return self._vars.get(name)
+        if self._lazy is not None:
+            self._load()
+        if name == "$_":
+            return self._last
+        n = result_number(name)
+        if n is None:
+            return self._named.get(name)
+        i = n - 1
+        if i < len(self._live) and self._live[i]:
+            return self._result(i)
+        return None
+
+    def _remove(self, name: str) -> bool:
+        n = result_number(name)
+        if n is None:
+            if name not in self._named:
+                return False
+            del self._named[name]
+            self._drop_formula(name)
+            if self._names is not None:
+                i = bisect_left(self._names, name)
+                if i < len(self._names) and self._names[i] == name:
+                    del self._names[i]
+            return True
+        i = n - 1
+        if i >= len(self._live) or not self._live[i]:
+            return False
+        self._live[i] = 0
+        self._live_count -= 1
+        self._boxed.pop(i, None)
+        return True
 
     def delete(self, name: str) -> bool:
-        if name in self._vars and name != "$_":
-            del self._vars[name]
+        if self._lazy is not None:
+            self._load()
+        if name != "$_" and self._remove(name):
+            self._changes.append(["delete", name])
             return True
         return False
 
-    def clear(self):
-        self._vars.clear()
+    def _reset(self):
+        self._named = {}
+        self._results = array("d")
+        self._live = bytearray()
+        self._boxed = {}
+        self._live_count = 0
+        self._names = []
         self._counter = 0
         self._last = None
+        self._lazy = None
+        self._formulas = {}
+        self._dependents = {}
+        if self._functions:
+            self._functions = {}
+            self._functions_version += 1
+
+    def clear(self):
+        self._reset()
+        self._changes.append(["clear"])
+
+    def _sorted_names(self) -> list[str]:
+        if self._names is None:
+            self._names = sorted(self._named)
+        return self._names
+
+    def names_with_prefix(self, prefix: str, limit: int | None = None) -> list[str]:
+        """Variable names starting with prefix, excluding $_.
+
+        Named variables come first in sorted order, then results in
+        numeric order.
+        """
+        if self._lazy is not None:
+            self._load()
+        out = []
+        names = self._sorted_names()
+        i = bisect_left(names, prefix)
+        while i < len(names) and names[i].startswith(prefix):
+            if limit is not None and len(out) >= limit:
+                return out
+            out.append(names[i])
+            i += 1
+        if prefix == "$" or (prefix[1:].isascii() and prefix[1:].isdigit()):
+            for n in _numbers_with_prefix(prefix[1:], len(self._live)):
+                if self._live[n - 1]:
+                    if limit is not None and len(out) >= limit:
+                        break
+                    out.append(f"${n}")
+        return out
+
+    def results(self, first: int = 1, last: int | None = None):
+        """Yield (name, value) for live results $first..$last, in order."""
+        if self._lazy is not None:
+            self._load()
+        stop = len(self._live) if last is None else min(last, len(self._live))
+        live = self._live
+        for i in range(max(first, 1) - 1, stop):
+            if live[i]:
+                yield f"${i + 1}", self._result(i)
+
+    def named(self) -> list[tuple[str, float]]:
+        """Named variables in sorted order, excluding $_."""
+        if self._lazy is not None:
+            self._load()
+        return [(name, self._named[name]) for name in self._sorted_names()]
 
     def items(self) -> list[tuple[str, float]]:
-        """Return variables sorted, excluding $_."""
-        return sorted(
-            [(k, v) for k, v in self._vars.items() if k != "$_"],
-            key=lambda x: x[0],
-        )
-
-    def substitute(self, expr: str) -> str:
-        """Replace $var references with their values. Detects circular refs."""
-        seen: set[str] = set()
-        return self._substitute(expr, seen, depth=0)
-
-    def _substitute(self, expr: str, seen: set[str], depth: int) -> str:
-        if depth > 100:
-            raise ValueError("circular reference detected")
-
-        def replacer(match):
-            name = match.group(0)
-            if name in seen:
-                raise ValueError(f"circular reference: {name}")
-            val = self._vars.get(name)
-            if val is None:
-                raise ValueError(f"undefined variable: {name}")
-            seen.add(name)
-            return str(val)
-
-        result = re.sub(r'\$[a-zA-Z_]\w*|\$\d+', replacer, expr)
-        # Check if more substitutions needed
-        if re.search(r'\$[a-zA-Z_]\w*|\$\d+', result):
-            return self._substitute(result, seen, depth + 1)
-        return result
+        """Return variables, excluding $_: results by N, then named ones sorted."""
+        return list(self.results()) + self.named()
+
+    def resolve(self, name: str):
+        """Value of a referenced variable, ready to bind into an expression."""
+        val = self.get(name)
+        if val is None:
+            raise ValueError(f"undefined variable: {name}")
+        return _native(val)
 
     def to_dict(self) -> dict:
         """Serialize for persistence."""
-        return {"vars": dict(self._vars), "counter": self._counter}
+        if self._lazy is not None:
+            self._load()
+        data = dict(self.results())
+        data.update(self._named)
+        if self._last is not None:
+            data["$_"] = self._last
+        functions = {name: [list(params), body] for name, (params, body) in self._functions.items()}
+        formulas = {name: [formula, list(refs)] for name, (formula, refs) in self._formulas.items()}
+        return {"vars": data, "counter": self._counter, "functions": functions,
+                "formulas": formulas}
 
     def from_dict(self, data: dict):
         """Restore from persistence."""
-        self._vars = data.get("vars", {})
+        self._reset()
+        for name, value in data.get("vars", {}).items():
+            if name == "$_":
+                self._last = value
+            else:
+                self._store(name, value)
+        for name, (params, body) in data.get("functions", {}).items():
+            self._define(name, params, body)
+        for name, (formula, refs) in data.get("formulas", {}).items():
+            self._set_formula(name, formula, tuple(refs))
+        self._names = None
         self._counter = data.get("counter", 0)
-        if "$_" in self._vars:
-            self._last = self._vars["$_"]
+        self._changes.clear()
+        self._replaced = True
+
+    def load_lazily(self, load, count: int, counter: int, last, functions=None,
+                    source: list | None = None):
+        """Replace the contents with load()'s, fetched on first access.
+
+        load() returns what from_dict takes. The count, result counter, last
+        value and functions are given up front so the toolbar and the
+        evaluator need no loading. source, such as ["sqlite", workspace],
+        says where load() reads from; it is journaled as a "restore" entry
+        instead of the store counting as replaced, so autosave doesn't have
+        to load everything to write a snapshot.
+        """
+        self.from_dict({"counter": counter, "functions": functions or {}})
+        self._last = last
+        self._lazy = (load, count)
+        if source is not None:
+            self._replaced = False
+            self._changes.append(["restore", *source])
+            self._restored.add(tuple(source))
+
+    def release(self, source: list):
+        """Stop relying on a restored workspace that is about to change or go.
+
+        A journaled "restore" replays whatever the workspace holds at the
+        time, so if source was restored since the last snapshot, its
+        contents are loaded now and the next autosave writes a snapshot.
+        """
+        if tuple(source) not in self._restored:
+            return
+        if self._lazy is not None:
+            self._load()
+        self._replaced = True
+
+    def _load(self):
+        load = self._lazy[0]
+        # from_dict clears the journal list in place, so keep a copy
+        changes, replaced = list(self._changes), self._replaced
+        self.from_dict(load())
+        # Loading isn't a change of its own; keep what a save still owes
+        self._changes, self._replaced = changes, replaced
+
+    def take_changes(self) -> tuple[list[list], bool]:
+        """Return journal entries recorded since the last call.
+
+        The flag is True when from_dict replaced the whole store, in which
+        case the entries alone can't reproduce it.
+        """
+        changes, replaced = self._changes, self._replaced
+        self._changes = []
+        self._replaced = False
+        if replaced:
+            # The snapshot this leads to holds the restored contents
+            self._restored.clear()
+        return changes, replaced
+
+    def apply_change(self, entry: list):
+        """Replay one journal entry without recording it."""
+        if self._lazy is not None:
+            self._load()
+        op = entry[0]
+        if op == "set":
+            _, name, value, counter = entry
+            if self._names is not None and result_number(name) is None:
+                # Replays can be long; rebuild the index once afterwards
+                self._names = None
+            self._store(name, value)
+            self._last = value
+            self._counter = max(self._counter, counter)
+        elif op == "update":
+            _, name, value = entry
+            self._store(name, value)
+        elif op == "formula":
+            _, name, formula, refs = entry
+            if formula is None:
+                self._drop_formula(name)
+            else:
+                self._set_formula(name, formula, tuple(refs))
+        elif op == "delete":
+            self._remove(entry[1])
+        elif op == "define":
+            _, name, params, body = entry
+            self._define(name, params, body)
+        elif op == "undefine":
+            if self._functions.pop(entry[1], None) is not None:
+                self._functions_version += 1
+        elif op == "clear":
+            self._reset()
+        else:
+            raise ValueError(f"unknown journal entry: {op}")
@@ -0,0 +1,161 @@
+"""Single-file SQLite workspace store (FIGYA_WORKSPACES=sqlite)."""
+
+import json
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from figya import arrays
+from figya.persistence import decode_object, encode_value
+from figya.variables import VariableStore
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    name     TEXT PRIMARY KEY,
+    saved_at REAL NOT NULL,
+    count    INTEGER NOT NULL,
+    counter  INTEGER NOT NULL,
+    last     TEXT
+);
+CREATE TABLE IF NOT EXISTS variables (
+    workspace TEXT NOT NULL REFERENCES workspaces(name) ON DELETE CASCADE,
+    name      TEXT NOT NULL,
+    value,
+    PRIMARY KEY (workspace, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS formulas (
+    workspace TEXT NOT NULL REFERENCES workspaces(name) ON DELETE CASCADE,
+    name      TEXT NOT NULL,
+    formula   TEXT NOT NULL,
+    refs      TEXT NOT NULL,
+    PRIMARY KEY (workspace, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS functions (
+    workspace TEXT NOT NULL REFERENCES workspaces(name) ON DELETE CASCADE,
+    name      TEXT NOT NULL,
+    params    TEXT NOT NULL,
+    body      TEXT NOT NULL,
+    PRIMARY KEY (workspace, name)
+) WITHOUT ROWID;
+"""
+
+
+def _encode(value):
+    # Floats go in as REAL, arrays as .npy BLOBs, anything else (hex strings,
+    # ints, fractions) as JSON text
+    if type(value) is float:
+        return value
+    if arrays.is_array(value):
+        return arrays.to_bytes(value)
+    return json.dumps(encode_value(value))
+
+
+def _decode(value):
+    if type(value) is float:
+        return value
+    if type(value) is bytes:
+        return arrays.from_bytes(value)
+    return json.loads(value, object_hook=decode_object)
+
+
+class WorkspaceDB:
+    """Named workspaces as rows in one SQLite file.
+
+    A workspace's metadata (variable count, result counter, last value,
+    save time) sits in its own small table, so listing and searching never
+    read variable values, and restoring reads them only when the store is
+    first used. User-defined functions are few and small, and are read
+    with the metadata.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def save(self, name: str, variables: VariableStore):
+        """Replace workspace `name` with the store's contents in one transaction."""
+        data = variables.to_dict()
+        values = data["vars"]
+        last = values.pop("$_", None)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM variables WHERE workspace = ?", (name,))
+            conn.execute("DELETE FROM functions WHERE workspace = ?", (name,))
+            conn.execute("DELETE FROM formulas WHERE workspace = ?", (name,))
+            conn.execute(
+                "INSERT OR REPLACE INTO workspaces VALUES (?, ?, ?, ?, ?)",
+                (name, time.time(), variables.count, data["counter"],
+                 None if last is None else json.dumps(encode_value(last))),
+            )
+            conn.executemany(
+                "INSERT INTO variables VALUES (?, ?, ?)",
+                ((name, var, _encode(value)) for var, value in values.items()),
+            )
+            conn.executemany(
+                "INSERT INTO formulas VALUES (?, ?, ?, ?)",
+                ((name, var, formula, " ".join(refs))
+                 for var, (formula, refs) in data["formulas"].items()),
+            )
+            conn.executemany(
+                "INSERT INTO functions VALUES (?, ?, ?, ?)",
+                ((name, fn, ",".join(params), body)
+                 for fn, (params, body) in data["functions"].items()),
+            )
+
+    def restore(self, name: str, variables: VariableStore) -> bool:
+        """Point the store at workspace `name`; values load on first access."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT count, counter, last FROM workspaces WHERE name = ?", (name,)
+            ).fetchone()
+            functions = {
+                fn: (tuple(params.split(",")) if params else (), body)
+                for fn, params, body in conn.execute(
+                    "SELECT name, params, body FROM functions WHERE workspace = ?", (name,)
+                )
+            }
+        if row is None:
+            return False
+        count, counter, last = row
+        last = None if last is None else json.loads(last, object_hook=decode_object)
+
+        def load() -> dict:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    "SELECT name, value FROM variables WHERE workspace = ?", (name,)
+                )
+                values = {var: _decode(value) for var, value in rows}
+                formulas = {
+                    var: (formula, refs.split())
+                    for var, formula, refs in conn.execute(
+                        "SELECT name, formula, refs FROM formulas WHERE workspace = ?", (name,)
+                    )
+                }
+            if last is not None:
+                values["$_"] = last
+            return {"vars": values, "counter": counter, "functions": functions,
+                    "formulas": formulas}
+
+        variables.load_lazily(load, count, counter, last, functions, ["sqlite", name])
+        return True
+
+    def delete(self, name: str) -> bool:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("DELETE FROM workspaces WHERE name = ?", (name,)).rowcount > 0
+
+    def search(self, pattern: str = "") -> list[tuple[str, int, float]]:
+        """(name, variable count, saved time) of workspaces whose name contains pattern."""
+        escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT name, count, saved_at FROM workspaces"
+                " WHERE name LIKE ? ESCAPE '\\' ORDER BY name",
+                (f"%{escaped}%",),
+            ).fetchall()
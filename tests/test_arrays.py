@@ -0,0 +1,31 @@
+import warnings
+
+import pytest
+
+from figya import arrays
+from figya.evaluator import Evaluator
+from figya.variables import VariableStore
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("start,stop,expected", [
+    (1, 5, [1, 2, 3, 4, 5]),
+    (0.5, 3, [0.5, 1.5, 2.5]),
+    (-1.5, 1, [-1.5, -0.5, 0.5]),
+    (0.1, 0.3, [0.1]),
+    (3, 1, []),
+])
+def test_span_is_inclusive_in_steps_of_one(start, stop, expected):
+    assert arrays.span(start, stop).tolist() == expected
+
+
+@pytest.mark.parametrize("line,shown", [
+    ("sqrt(-1..1)", "[NaN  0  1] (3 values)"),
+    ("1/(0..2)", "[inf  1  0.5] (3 values)"),
+    ("ln(0..2)", "[-inf  0  0.6931471806] (3 values)"),
+])
+def test_invalid_elements_show_without_warnings(line, shown):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert Evaluator(VariableStore()).compute(line)[1] == shown
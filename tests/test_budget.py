@@ -0,0 +1,44 @@
+import ast
+
+import pytest
+
+from figya.budget import is_risky
+from figya.evaluator import Evaluator
+from figya.variables import VariableStore
+
+
+def _risky_functions(*definitions):
+    evaluator = Evaluator(VariableStore())
+    for line in definitions:
+        evaluator.evaluate(line)
+    evaluator._sync_functions()
+    return evaluator._risky_functions
+
+
+def test_recursive_functions_are_risky():
+    assert _risky_functions(
+        "fib(x) = 1 if x < 2 else fib(x-1) + fib(x-2)",
+        "ev(x) = 1 if x == 0 else od(x-1)",
+        "od(x) = 0 if x == 0 else ev(x-1)",
+        "twice(x) = fib(x) * 2",
+        "sq(x) = x*x",
+    ) == {"fib", "ev", "od", "twice"}
+
+
+@pytest.mark.parametrize("expr,risky", [
+    ("lcm(4, 6)", False),
+    ("2^(1+1)", False),
+    ("2 ** (3*4) - 1", False),
+    ("factorial(2*5)", False),
+    ("lcm(x, y)", False),
+    ("2^x", True),
+    ("factorial(x)", True),
+    ("factorial(10^9)", True),
+    ("2^(9^9^9)", True),
+    ("2^(10^6)", True),
+    ("lcm(2^99999, 3^99999)", True),
+    ("lcm(*x)", True),
+    ("span(1, 10)", True),
+])
+def test_constant_subexpressions_are_folded(expr, risky):
+    assert is_risky(ast.parse(expr, mode="eval")) is risky
@@ -0,0 +1,95 @@
+import ast
+
+import pytest
+
+from figya.compiler import NotCompilable, compile_expression
+from figya.evaluator import COMPILE_AFTER, Evaluator
+from figya.variables import VariableStore
+
+
+def _outcome(evaluator, line):
+    try:
+        _, display, unit = evaluator.compute(line)
+    except ValueError as e:
+        return "error", str(e)
+    return display, unit
+
+
+def _walked_and_compiled(evaluator, line):
+    """The outcome of line from the tree walk, then from its compiled function."""
+    outcomes = [_outcome(evaluator, line) for _ in range(COMPILE_AFTER + 1)]
+    key = (line, True) if evaluator.exact else line
+    compiled = evaluator.compiled_cache.get(key)
+    return outcomes[0], outcomes[-1], callable(compiled)
+
+
+@pytest.fixture
+def evaluator():
+    evaluator = Evaluator(VariableStore())
+    evaluator.evaluate("$xs = 1..10")
+    evaluator.evaluate("$x = 3")
+    return evaluator
+
+
+@pytest.mark.parametrize("line", [
+    "2 ** 5000000",
+    "1 << 20000",
+    "1/0",
+    "2^200 + 1",
+    "sin(pi/4) * 3",
+    "$x * 2 if $x > 2 else 0",
+    "sum($xs)",
+    "$xs * 2 + 1",
+    "std($xs ^ 2)",
+])
+def test_compiled_matches_tree_walk(evaluator, line):
+    walked, compiled, was_compiled = _walked_and_compiled(evaluator, line)
+    assert was_compiled
+    assert compiled == walked
+
+
+@pytest.mark.parametrize("line", ["1/3 + 1/7", "2^200 + 1", "0.1 * 3", "1/0", "1 << 20000"])
+def test_compiled_matches_tree_walk_in_exact_mode(line):
+    evaluator = Evaluator(VariableStore(), exact=True)
+    walked, compiled, was_compiled = _walked_and_compiled(evaluator, line)
+    assert was_compiled
+    assert compiled == walked
+
+
+def test_exact_mode_recompiles(evaluator):
+    _walked_and_compiled(evaluator, "1/3")
+    evaluator.exact = True
+    walked, compiled, was_compiled = _walked_and_compiled(evaluator, "1/3")
+    assert was_compiled
+    assert compiled == walked == ("1/3 ≈ 0.3333333333", "")
+
+
+def test_undefined_name_falls_back_to_tree_walk(evaluator):
+    walked, compiled, was_compiled = _walked_and_compiled(evaluator, "nope + 1")
+    assert not was_compiled
+    assert compiled == walked
+    assert walked[0] == "error"
+
+
+def _compile(source, names=None):
+    engine = Evaluator(VariableStore())._engine
+    node = ast.parse(source, mode="eval")
+    return compile_expression(node, ["x"], engine.operators, engine.functions,
+                              names if names is not None else engine.names)
+
+
+@pytest.mark.parametrize("source", [
+    "'abc' * 3",
+    "x.real",
+    "x[0]",
+    "nope + 1",
+    "sqrt(x=2)",
+    "(lambda: 1)()",
+])
+def test_outside_whitelist_is_not_compilable(source):
+    with pytest.raises(NotCompilable):
+        _compile(source)
+
+
+def test_compiled_function_takes_slots():
+    assert _compile("x * 2 + pi")(1) == pytest.approx(2 + 3.141592653589793)
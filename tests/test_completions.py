@@ -0,0 +1,49 @@
+import pytest
+from prompt_toolkit.document import Document
+
+from figya import completions
+from figya.completions import COMPLETIONS, UNIT_RANK, CompletionIndex, FigyaCompleter
+from figya.variables import VariableStore
+
+
+@pytest.fixture
+def completer(monkeypatch):
+    monkeypatch.setattr(completions, "list_workspaces", lambda: ["geo", "project-x"])
+    variables = VariableStore()
+    variables.define("hyp", ("a", "b"), "sqrt(a**2 + b**2)")
+    variables.set("$total", 4)
+    completer = FigyaCompleter(variables)
+    completer._units_indexed = True
+    completer.index.add(["S", "s", "sr", "St", "sq_ft", "second"], UNIT_RANK)
+    return completer
+
+
+def _complete(completer, text):
+    return [c.text for c in completer.get_completions(Document(text), None)]
+
+
+def test_words_rank_ahead_of_shorter_units():
+    index = CompletionIndex(COMPLETIONS)
+    index.add(["S", "s", "sr", "St"], UNIT_RANK)
+    matches = index.search("s")
+    assert matches.index("sqrt(") < matches.index("S")
+    assert matches.index("save ") < matches.index("s")
+    assert matches[-4:] == ["S", "s", "sr", "St"]
+
+
+def test_user_functions_come_first(completer):
+    assert _complete(completer, "hy")[0] == "hyp("
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("restore ", ["geo", "project-x"]),
+    ("restore pro", ["project-x"]),
+    ("save g", ["geo"]),
+    ("delete ", ["hyp", "ws "]),
+    ("delete ws g", ["ws geo"]),
+    ("delete $t", ["$total"]),
+    ("exact o", ["on", "off"]),
+    ("list s", []),
+])
+def test_command_arguments_complete_without_units(completer, text, expected):
+    assert _complete(completer, text) == expected
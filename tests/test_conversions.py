@@ -0,0 +1,59 @@
+import warnings
+
+import pytest
+
+from figya.evaluator import _NOT_AFFINE, Evaluator
+from figya.variables import VariableStore
+
+
+VALUES = [0.0, 1.0, 0.5, 7.0, 100.0, -40.0, 12345.678, 1e-3]
+
+
+@pytest.fixture(scope="module")
+def evaluator():
+    return Evaluator(VariableStore())
+
+
+def _pint(evaluator, value, from_unit, to_unit):
+    ureg = evaluator._get_ureg()
+    return float(ureg.Quantity(value, from_unit).to(to_unit).magnitude)
+
+
+@pytest.mark.parametrize("from_unit,to_unit", [
+    ("meter", "foot"),
+    ("mile", "kilometer"),
+    ("kilogram", "pound"),
+    ("ounce", "gram"),
+])
+def test_scaling_matches_pint_exactly(evaluator, from_unit, to_unit):
+    scale, offset, _ = evaluator._conversion_factors(from_unit, to_unit)
+    assert offset == 0
+    for x in VALUES:
+        assert scale * x + offset == _pint(evaluator, x, from_unit, to_unit)
+
+
+@pytest.mark.parametrize("from_unit,to_unit", [
+    ("degF", "degC"),
+    ("degC", "degF"),
+    ("kelvin", "degF"),
+])
+def test_offset_matches_pint(evaluator, from_unit, to_unit):
+    scale, offset, _ = evaluator._conversion_factors(from_unit, to_unit)
+    for x in VALUES:
+        expected = _pint(evaluator, x, from_unit, to_unit)
+        assert scale * x + offset == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+
+@pytest.mark.parametrize("from_unit,to_unit", [("dBm", "mW"), ("mW", "dBm"), ("dB", "percent")])
+def test_logarithmic_units_go_through_pint(evaluator, from_unit, to_unit):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert evaluator._conversion_factors(from_unit, to_unit) is _NOT_AFFINE
+    assert not caught
+    assert evaluator.compute(f"10 {from_unit} in {to_unit}")[0] == pytest.approx(
+        _pint(evaluator, 10.0, from_unit, to_unit))
+
+
+def test_unit_label(evaluator):
+    assert evaluator._conversion_factors("degF", "degC")[2] == "°C"
+    assert evaluator.compute("100 F in C")[1] == "37.77777778 °C"
@@ -0,0 +1,63 @@
+import pytest
+
+from figya import persistence
+from figya.variables import VariableStore
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistence, "AUTOSAVE_FILE", tmp_path / "autosave.json")
+    monkeypatch.setattr(persistence, "JOURNAL_FILE", tmp_path / "autosave.journal")
+    monkeypatch.setattr(persistence, "WORKSPACES_DIR", tmp_path / "workspaces")
+    monkeypatch.setattr(persistence, "WORKSPACES_DB", tmp_path / "workspaces.db")
+    monkeypatch.setattr(persistence, "WORKSPACE_BACKEND", "sqlite")
+
+
+def _session():
+    variables = VariableStore()
+    persistence.autoload(variables)
+    return variables
+
+
+def _saved_workspace(name, **values):
+    variables = VariableStore()
+    for var, value in values.items():
+        variables.set(f"${var}", value)
+    persistence.save_workspace(name, variables)
+
+
+def test_restore_then_change_survives_autosave():
+    _saved_workspace("ws", a=1, b=2)
+    variables = _session()
+    persistence.restore_workspace("ws", variables)
+    variables.set("$c", 5)
+    persistence.autosave(variables)
+    assert dict(_session().named()) == {"$a": 1, "$b": 2, "$c": 5}
+
+
+def test_deleting_a_restored_workspace_keeps_its_contents():
+    _saved_workspace("ws", a=1)
+    variables = _session()
+    persistence.restore_workspace("ws", variables)
+    persistence.autosave(variables)
+
+    variables = _session()
+    assert persistence.delete_workspace("ws", variables)
+    assert dict(variables.named()) == {"$a": 1}
+    persistence.autosave(variables)
+    assert dict(_session().named()) == {"$a": 1}
+
+
+def test_overwriting_a_restored_workspace():
+    _saved_workspace("ws", a=1)
+    variables = _session()
+    persistence.restore_workspace("ws", variables)
+    persistence.autosave(variables)
+
+    variables = _session()
+    variables.delete("$a")
+    variables.set("$b", 2)
+    persistence.save_workspace("ws", variables)
+    variables.set("$c", 3)
+    persistence.autosave(variables)
+    assert dict(_session().named()) == {"$b": 2, "$c": 3}
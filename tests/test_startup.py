@@ -0,0 +1,65 @@
+"""Cold-start budgets: fails when an entry path gets slower or imports more."""
+
+import os
+import sys
+
+import pytest
+
+from figya import bench
+
+
+# figya modules and third-party packages each entry path may load. Adding
+# one here should be a deliberate choice; pint's own dependencies vary by
+# install, so the conversion path only pins figya's modules.
+_CORE = {
+    "figya", "figya.arrays", "figya.budget", "figya.cache", "figya.cli", "figya.compiler",
+    "figya.config", "figya.evaluator", "figya.exact", "figya.functions", "figya.tokenizer",
+    "figya.units", "figya.variables",
+}
+EXPECTED_MODULES = {
+    "-e math": (_CORE, {"simpleeval"}),
+    "-e conversion": (_CORE, None),
+    "pipe": (_CORE | {"figya.commands", "figya.persistence", "figya.pipe"}, {"simpleeval"}),
+    "repl import": (
+        _CORE - {"figya.cli"} | {
+            "figya.commands", "figya.completions", "figya.highlighting", "figya.history",
+            "figya.persistence", "figya.repl", "figya.timing",
+        },
+        {"simpleeval", "prompt_toolkit", "pygments", "wcwidth"},
+    ),
+}
+
+
+# Top-level names the standard library probes for without them being packages
+# (xml and pickle try org.python.core, for Jython)
+_PROBED = {"org"}
+
+
+@pytest.fixture(scope="module")
+def report():
+    return {"results": bench._cold_start(runs=3)}
+
+
+@pytest.fixture(scope="module")
+def startup_modules(tmp_path_factory):
+    """Modules the interpreter loads before figya does anything."""
+    env = dict(os.environ, FIGYA_DATA_DIR=str(tmp_path_factory.mktemp("data")))
+    return set(bench._imports(["-c", "pass"], None, env)[0])
+
+
+def test_startup_within_budget(report):
+    assert bench.check_startup(report) == []
+
+
+@pytest.mark.parametrize("label", list(EXPECTED_MODULES))
+def test_startup_imports_nothing_new(report, startup_modules, label):
+    figya_modules, packages = EXPECTED_MODULES[label]
+    loaded = set(report["results"][f"cold_start.{label}"]["modules"]) - startup_modules
+    assert {m for m in loaded if m.split(".")[0] == "figya"} <= figya_modules
+    if packages is not None:
+        third_party = {
+            m.split(".")[0] for m in loaded
+            if m.split(".")[0] not in sys.stdlib_module_names | _PROBED
+            and not m.startswith("_") and not m.startswith("figya")
+        }
+        assert third_party <= packages
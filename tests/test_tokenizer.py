@@ -0,0 +1,35 @@
+import pytest
+
+from figya.evaluator import Evaluator
+from figya.tokenizer import NUMBER, tokenize
+from figya.variables import VariableStore
+
+
+@pytest.fixture
+def evaluator():
+    evaluator = Evaluator(VariableStore())
+    evaluator.evaluate("$a = 3")
+    evaluator.evaluate("$b = 4")
+    return evaluator
+
+
+@pytest.mark.parametrize("text", ["1_000", "1_000.000_1", "1e1_0", "0x_ff", "0b1_0", ".5_0"])
+def test_numbers_take_digit_separators(text):
+    assert [(tok.kind, tok.text) for tok in tokenize(text)] == [(NUMBER, text)]
+
+
+@pytest.mark.parametrize("line,shown", [
+    ("1_000 + 1", "1,001"),
+    ("0x_ff", "255"),
+    ("$a$b", "12"),
+    ("2$a$b", "24"),
+])
+def test_evaluates(evaluator, line, shown):
+    assert evaluator.compute(line)[1] == shown
+
+
+def test_errors_name_variables_not_placeholders(evaluator):
+    with pytest.raises(ValueError) as e:
+        evaluator.compute("$a(3) + $b")
+    assert "'$a'" in str(e.value)
+    assert "var_" not in str(e.value)